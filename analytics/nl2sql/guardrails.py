@@ -1,11 +1,17 @@
 """SQL safety and validation guardrails."""
 
+import fnmatch
+import functools
 import re
-from typing import List, Tuple
+from types import MappingProxyType
+from typing import Any, Dict, List, Set, Tuple
 
 import sqlglot
-from sqlglot import parse_one, transpile
+from sqlglot import exp, transpile
+from sqlglot.dialects.duckdb import DuckDB
 from sqlglot.expressions import Expression
+from sqlglot.optimizer.scope import traverse_scope
+from sqlglot.tokens import TokenType
 
 from app.config import Config
 
@@ -14,22 +20,70 @@ class SQLGuardrails:
     """SQL safety validator to prevent dangerous operations."""
 
     # Dangerous keywords that should be blocked
-    BLOCKED_KEYWORDS = {
+    BLOCKED_KEYWORDS = frozenset({
         'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER', 'TRUNCATE',
         'GRANT', 'REVOKE', 'EXEC', 'EXECUTE', 'CALL', 'MERGE', 'REPLACE'
-    }
+    })
 
     # Functions that should be blocked for security
-    BLOCKED_FUNCTIONS = {
+    BLOCKED_FUNCTIONS = frozenset({
         'LOAD_FILE', 'INTO OUTFILE', 'INTO DUMPFILE', 'LOAD DATA',
         'SYSTEM', 'SHELL', 'EVAL', 'EXEC'
-    }
+    })
+
+    # Statement nodes that write data or schema, mapped to the keyword reported
+    WRITE_STATEMENTS = MappingProxyType({
+        exp.Insert: 'INSERT', exp.Update: 'UPDATE', exp.Delete: 'DELETE', exp.Drop: 'DROP',
+        exp.Create: 'CREATE', exp.AlterTable: 'ALTER', exp.Merge: 'MERGE', exp.Into: 'INTO'
+    })
+
+    # Case-folded once, so checks fold individual names rather than the whole SQL string
+    _BLOCKED_KEYWORDS_FOLDED = frozenset(keyword.casefold() for keyword in BLOCKED_KEYWORDS)
+    _BLOCKED_FUNCTIONS_FOLDED = frozenset(func.casefold() for func in BLOCKED_FUNCTIONS)
+
+    # Text patterns are only needed to name the problem when SQL fails to parse
+    _WORD_RE = re.compile(r'\w+')
+    _BLOCKED_FUNCTION_RE = re.compile(
+        '|'.join(re.escape(func) for func in sorted(BLOCKED_FUNCTIONS, key=len, reverse=True)),
+        re.IGNORECASE
+    )
 
     def __init__(self, max_rows: int = None, allowed_schemas: List[str] = None):
         """Initialize guardrails with configuration."""
+        # Results depend only on the SQL text and this instance's settings,
+        # so repeated queries skip cleaning, parsing and rewriting
+        self._validate_impl = functools.lru_cache(maxsize=1024)(self._validate_impl)
+        
         self.max_rows = max_rows or Config.MAX_ROWS
         self.allowed_schemas = allowed_schemas or Config.ALLOWED_SCHEMAS
 
+    @property
+    def max_rows(self) -> int:
+        """Maximum number of rows a validated query may return."""
+        return self._max_rows
+
+    @max_rows.setter
+    def max_rows(self, value: int) -> None:
+        self._max_rows = value
+        self._validate_impl.cache_clear()
+
+    @property
+    def allowed_schemas(self) -> Tuple[str, ...]:
+        """Glob patterns for the tables a query may reference (assign to change them)."""
+        return self._allowed_schemas
+
+    @allowed_schemas.setter
+    def allowed_schemas(self, value: List[str]) -> None:
+        self._allowed_schemas = tuple(value)
+        
+        # Compile all globs into one anchored alternation, so each table is a single
+        # match; an empty allowlist compiles to (?!), which never matches
+        self._allow_re = re.compile(
+            '|'.join(fnmatch.translate(pattern) for pattern in self._allowed_schemas) or '(?!)',
+            re.IGNORECASE
+        )
+        self._validate_impl.cache_clear()
+
     def validate_sql(self, sql: str) -> Tuple[bool, str, str]:
         """
         Validate SQL query for safety and compliance.
@@ -37,152 +91,190 @@ class SQLGuardrails:
         Returns:
             Tuple of (is_valid, error_message, cleaned_sql)
         """
-        try:
-            # Basic syntax validation
-            sql = sql.strip()
-            if not sql:
-                return False, "Empty SQL query", ""
-
-            # Remove comments and normalize
-            cleaned_sql = self._clean_sql(sql)
+        # Cheapest check first; stripping also lets whitespace variants share a cache entry
+        stripped = sql.strip() if sql else ""
+        if not stripped:
+            return False, "Empty SQL query", ""
+        
+        return self._validate_impl(stripped)
 
-            # Check for blocked keywords
-            is_valid, error = self._check_blocked_keywords(cleaned_sql)
-            if not is_valid:
-                return False, error, ""
+    def cache_stats(self) -> Dict[str, Any]:
+        """Get validation cache statistics."""
+        info = self._validate_impl.cache_info()
+        lookups = info.hits + info.misses
+        
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "max_size": info.maxsize,
+            "hit_rate": info.hits / lookups if lookups else 0.0
+        }
 
-            # Parse SQL with sqlglot
+    def _validate_impl(self, sql: str) -> Tuple[bool, str, str]:
+        """Uncached validation of stripped, non-empty SQL; must not mutate the instance."""
+        try:
+            # Parse once; every check below works on the AST, which also keeps
+            # keywords inside string literals from tripping the checks
             try:
-                parsed = parse_one(cleaned_sql, dialect="duckdb")
+                statements = [stmt for stmt in sqlglot.parse(sql, read="duckdb") if stmt is not None]
             except Exception as e:
+                # Name the dangerous keyword or function if that is why parsing failed
+                for check in (self._check_blocked_keywords, self._check_blocked_functions):
+                    is_valid, error = check(sql)
+                    if not is_valid:
+                        return False, error, ""
                 return False, f"SQL parsing error: {str(e)}", ""
 
+            if not statements:
+                return False, "Empty SQL query", ""
+
+            # Check write operations, functions and the schema allowlist in one walk per statement
+            for statement in statements:
+                is_valid, error = self._check_statement(statement)
+                if not is_valid:
+                    return False, error, ""
+
+            if len(statements) > 1:
+                return False, "Multiple statements are not allowed", ""
+
             # Validate SELECT-only operations
+            parsed = statements[0]
             if not self._is_select_only(parsed):
                 return False, "Only SELECT statements are allowed", ""
 
-            # Check schema allowlist
-            is_valid, error = self._check_schema_allowlist(parsed)
-            if not is_valid:
-                return False, error, ""
-
-            # Enforce row limit
-            cleaned_sql = self._enforce_row_limit(cleaned_sql)
-
-            # Validate functions
-            is_valid, error = self._check_blocked_functions(cleaned_sql)
-            if not is_valid:
-                return False, error, ""
+            # Enforce row limit on the original text; the AST is only used for the checks
+            cleaned_sql = self._enforce_row_limit(sql)
 
             return True, "", cleaned_sql
 
         except Exception as e:
             return False, f"Validation error: {str(e)}", ""
 
-    def _clean_sql(self, sql: str) -> str:
-        """Clean and normalize SQL query."""
-        # Remove SQL comments
-        sql = re.sub(r'--.*$', '', sql, flags=re.MULTILINE)
-        sql = re.sub(r'/\*.*?\*/', '', sql, flags=re.DOTALL)
-        
-        # Normalize whitespace
-        sql = ' '.join(sql.split())
-        
-        return sql.strip()
-
     def _check_blocked_keywords(self, sql: str) -> Tuple[bool, str]:
         """Check for dangerous SQL keywords."""
-        sql_upper = sql.upper()
-        
-        for keyword in self.BLOCKED_KEYWORDS:
-            # Use word boundaries to avoid false positives
-            pattern = r'\b' + re.escape(keyword) + r'\b'
-            if re.search(pattern, sql_upper):
-                return False, f"Blocked keyword detected: {keyword}"
+        # Whole-word tokens avoid false positives such as UPDATE in updated_at
+        keyword = next(
+            (token for token in self._WORD_RE.findall(sql)
+             if token.casefold() in self._BLOCKED_KEYWORDS_FOLDED),
+            None
+        )
+        if keyword:
+            return False, f"Blocked keyword detected: {keyword.upper()}"
         
         return True, ""
 
     def _check_blocked_functions(self, sql: str) -> Tuple[bool, str]:
         """Check for dangerous SQL functions."""
-        sql_upper = sql.upper()
-        
-        for func in self.BLOCKED_FUNCTIONS:
-            if func in sql_upper:
-                return False, f"Blocked function detected: {func}"
+        match = self._BLOCKED_FUNCTION_RE.search(sql)
+        if match:
+            return False, f"Blocked function detected: {match.group(0).upper()}"
         
         return True, ""
 
-    def _is_select_only(self, parsed: Expression) -> bool:
-        """Verify query contains only SELECT statements."""
-        # sqlglot expression type checking
-        from sqlglot.expressions import Select, Union, CTE
-        
-        if isinstance(parsed, (Select, Union, CTE)):
-            return True
+    def _check_statement(self, parsed: Expression) -> Tuple[bool, str]:
+        """Check one parsed statement for writes, blocked functions and disallowed tables."""
+        tables = []
         
-        return False
-
-    def _check_schema_allowlist(self, parsed: Expression) -> Tuple[bool, str]:
-        """Validate that all tables/schemas are in allowlist."""
-        # Extract table references from parsed SQL
-        tables = self._extract_table_references(parsed)
+        for node, _, _ in parsed.walk():
+            if isinstance(node, exp.Command):
+                if node.name.casefold() in self._BLOCKED_KEYWORDS_FOLDED:
+                    return False, f"Blocked keyword detected: {node.name.upper()}"
+                return False, "Only SELECT statements are allowed"
+            
+            keyword = self.WRITE_STATEMENTS.get(type(node))
+            if keyword in self.BLOCKED_KEYWORDS:
+                return False, f"Blocked keyword detected: {keyword}"
+            if keyword:
+                return False, "Only SELECT statements are allowed"
+            
+            if isinstance(node, exp.Anonymous) and node.name.casefold() in self._BLOCKED_FUNCTIONS_FOLDED:
+                return False, f"Blocked function detected: {node.name.upper()}"
+            elif isinstance(node, exp.Table) and node.name:
+                tables.append(node)
         
+        cte_references = self._cte_references(parsed)
         for table in tables:
-            if not self._is_table_allowed(table):
-                return False, f"Access to table '{table}' is not allowed"
+            # References to a CTE visible in the table's own scope are not warehouse tables
+            if id(table) in cte_references:
+                continue
+            
+            schema_table = ".".join(part for part in (table.catalog, table.db, table.name) if part)
+            if not self._is_table_allowed(schema_table):
+                return False, f"Access to table '{schema_table}' is not allowed"
         
         return True, ""
 
-    def _extract_table_references(self, parsed: Expression) -> List[str]:
-        """Extract all table references from parsed SQL."""
-        tables = []
+    def _cte_references(self, parsed: Expression) -> Set[int]:
+        """Return ids of Table nodes that resolve to a CTE defined in their own scope."""
+        references = set()
         
-        # Use sqlglot to find all table references
-        for table in parsed.find_all(sqlglot.expressions.Table):
-            if table.name:
-                schema_table = ""
-                if table.db:
-                    schema_table += table.db + "."
-                if table.catalog:
-                    schema_table = table.catalog + "." + schema_table
-                schema_table += table.name
-                tables.append(schema_table)
+        try:
+            scopes = traverse_scope(parsed)
+        except Exception:
+            # Unresolvable scopes exempt nothing, so every table faces the allowlist
+            return references
         
-        return tables
+        for scope in scopes:
+            cte_names = {name.lower() for name in scope.cte_sources}
+            for table in scope.tables:
+                if not table.db and table.name.lower() in cte_names:
+                    references.add(id(table))
+        
+        return references
+
+    def _is_select_only(self, parsed: Expression) -> bool:
+        """Verify query contains only SELECT statements."""
+        return isinstance(parsed, (exp.Select, exp.Union, exp.CTE))
 
     def _is_table_allowed(self, table: str) -> bool:
         """Check if table matches allowed schema patterns."""
-        for pattern in self.allowed_schemas:
-            # Convert glob pattern to regex
-            regex_pattern = pattern.replace('*', '.*').replace('?', '.')
-            if re.match(f"^{regex_pattern}$", table, re.IGNORECASE):
-                return True
-        
-        return False
+        return self._allow_re.match(table) is not None
 
     def _enforce_row_limit(self, sql: str) -> str:
-        """Add or modify LIMIT clause to enforce row limits."""
-        sql_upper = sql.upper()
-        
-        # Check if LIMIT already exists
-        limit_match = re.search(r'\bLIMIT\s+(\d+)\b', sql_upper)
-        
-        if limit_match:
-            # Extract existing limit
-            existing_limit = int(limit_match.group(1))
-            if existing_limit > self.max_rows:
-                # Replace with max allowed
-                sql = re.sub(
-                    r'\bLIMIT\s+\d+\b', 
-                    f'LIMIT {self.max_rows}', 
-                    sql, 
-                    flags=re.IGNORECASE
-                )
-        else:
-            # Add LIMIT clause
-            sql = sql.rstrip(';') + f' LIMIT {self.max_rows}'
-        
-        return sql
+        """Add or modify the outer LIMIT clause to enforce row limits."""
+        # Work on tokens rather than re-rendering the AST: sqlglot rewrites some valid
+        # DuckDB functions (MEDIAN, PERCENTILE_CONT, DATE_ADD) into SQL DuckDB rejects
+        tokens = DuckDB().tokenize(sql)
+        while tokens and tokens[-1].token_type == TokenType.SEMICOLON:
+            tokens.pop()
+        
+        # Each piece keeps its source text; any gap holding a comment collapses to a space
+        pieces = []
+        previous_end = None
+        for token in tokens:
+            gap = sql[previous_end + 1:token.start] if previous_end is not None else ""
+            pieces.append((" " if gap else "") + sql[token.start:token.end + 1])
+            previous_end = token.end
+        
+        # The outer LIMIT is the last one outside any parentheses; it also binds to a UNION
+        depth = 0
+        limit_index = None
+        offset_indices = []
+        for index, token in enumerate(tokens):
+            if token.token_type in (TokenType.L_PAREN, TokenType.L_BRACKET, TokenType.L_BRACE):
+                depth += 1
+            elif token.token_type in (TokenType.R_PAREN, TokenType.R_BRACKET, TokenType.R_BRACE):
+                depth -= 1
+            elif depth == 0 and token.token_type == TokenType.LIMIT:
+                limit_index = index
+            elif depth == 0 and token.token_type == TokenType.OFFSET:
+                offset_indices.append(index)
+        
+        if limit_index is None:
+            pieces.append(f" LIMIT {self.max_rows}")
+            return "".join(pieces)
+        
+        # The limit expression runs up to a trailing OFFSET or the end of the statement
+        end = next((index for index in offset_indices if index > limit_index), len(tokens))
+        existing_limit = tokens[limit_index + 1:end]
+        
+        # Keep an existing literal LIMIT within bounds; anything else is replaced
+        if (len(existing_limit) != 1 or not existing_limit[0].text.isdigit()
+                or int(existing_limit[0].text) > self.max_rows):
+            pieces[limit_index + 1:end] = [f" {self.max_rows}"]
+        
+        return "".join(pieces)
 
     def get_safe_sql_template(self, user_sql: str) -> str:
         """Generate a safe SQL template with parameterized queries."""
@@ -196,6 +196,33 @@ class BigQueryRunner:
         except Exception as e:
             raise Exception(f"Failed to load DataFrame: {str(e)}")
 
+    def load_csv_to_table(self, csv_path: str, table_name: str, dataset_id: str = None,
+                          schema: List[bigquery.SchemaField] = None) -> None:
+        """Load a CSV file into a BigQuery table with a native load job (parsed server-side)."""
+        try:
+            dataset_id = dataset_id or self.config.BQ_DATASET
+            table_ref = self.client.dataset(dataset_id).table(table_name)
+            
+            # Configure job
+            job_config = bigquery.LoadJobConfig()
+            job_config.source_format = bigquery.SourceFormat.CSV
+            job_config.skip_leading_rows = 1
+            job_config.write_disposition = bigquery.WriteDisposition.WRITE_TRUNCATE
+            if schema:
+                job_config.schema = schema
+            else:
+                job_config.autodetect = True
+            
+            # Stream the file straight to the load job
+            with open(csv_path, 'rb') as f:
+                job = self.client.load_table_from_file(f, table_ref, job_config=job_config)
+            job.result()  # Wait for job to complete
+            
+            print(f"Loaded {job.output_rows} rows into {dataset_id}.{table_name}")
+            
+        except Exception as e:
+            raise Exception(f"Failed to load CSV {csv_path}: {str(e)}")
+
     def execute_script(self, script_content: str) -> None:
         """Execute a SQL script (multiple statements)."""
         try:
@@ -1,19 +1,37 @@
 """DuckDB runner for local development and demo."""
 
+import copy
+import functools
 import os
+import re
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple, Union
 
 import duckdb
 import pandas as pd
 
 from app.config import Config
 
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+# Statements that can change the catalog; conservative, so a false match only costs a refresh
+_DDL_RE = re.compile(r'\b(CREATE|DROP|ALTER|ATTACH|DETACH|IMPORT)\b', re.IGNORECASE)
+
+# Only plain reads are result-cached, and never ones whose answer can change between calls
+_READ_ONLY_RE = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+_NONDETERMINISTIC_RE = re.compile(
+    r'\b(random|uuid|gen_random_uuid|setseed|nextval|currval|now|today|'
+    r'current_(date|time|timestamp)|get_current_time|read_\w+|\w+_scan|glob)\b',
+    re.IGNORECASE
+)
+
 
 class DuckDBRunner:
     """Database runner for DuckDB (local development)."""
 
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, result_cache_size: int = 128):
         """Initialize DuckDB connection."""
         self.db_path = db_path or Config.DUCKDB_PATH
         
@@ -23,6 +41,17 @@ class DuckDBRunner:
         # Connect to DuckDB
         self.conn = duckdb.connect(self.db_path)
         
+        # Schema metadata is cached until DDL runs through this runner
+        self._schema_cache = None
+        self._ddl_counter = 0
+        
+        # LRU of read-only query results keyed on (sql, params, _ddl_counter); 0 disables it
+        self._result_cache = OrderedDict()
+        self._result_cache_size = result_cache_size
+        
+        # Plans are memoized per (sql, _ddl_counter), so DDL naturally retires old entries
+        self._explain = functools.lru_cache(maxsize=128)(self._explain)
+        
         # Install and load required extensions
         self._setup_extensions()
 
@@ -40,19 +69,31 @@ class DuckDBRunner:
         except Exception as e:
             print(f"Warning: Could not install DuckDB extensions: {e}")
 
-    def execute_query(self, sql: str, params: Dict = None) -> Tuple[pd.DataFrame, Dict]:
+    def execute_query(self, sql: str, params: Union[Dict, Sequence] = None) -> Tuple[pd.DataFrame, Dict]:
         """
         Execute SQL query and return results.
         
+        Args:
+            sql: Query text, optionally with ``?`` or ``$name`` placeholders
+            params: Positional list or named dict of values for the placeholders
+        
         Returns:
             Tuple of (dataframe, metadata)
         """
+        cache_key = None
+        params_key = self._params_key(params)
+        if (self._result_cache_size and params_key is not None and _READ_ONLY_RE.match(sql)
+                and not _NONDETERMINISTIC_RE.search(sql)):
+            cache_key = (sql, params_key, self._ddl_counter)
+            cached = self._result_cache.get(cache_key)
+            if cached is not None:
+                self._result_cache.move_to_end(cache_key)
+                result, metadata = cached
+                return result.copy(), {**copy.deepcopy(metadata), "cache_hit": True}
+        
         try:
             # Execute query
-            if params:
-                result = self.conn.execute(sql, params).fetchdf()
-            else:
-                result = self.conn.execute(sql).fetchdf()
+            result = self._execute(sql, params).fetchdf()
             
             # Get metadata
             metadata = {
@@ -62,16 +103,77 @@ class DuckDBRunner:
                 "dtypes": {col: str(dtype) for col, dtype in result.dtypes.items()},
                 "execution_time_ms": None,  # DuckDB doesn't provide this directly
                 "warehouse": "DuckDB",
-                "database_path": self.db_path
+                "database_path": self.db_path,
+                "cache_hit": False
             }
             
+            if cache_key is not None:
+                # Store private copies so callers mutating the frame or metadata can't corrupt the cache
+                self._result_cache[cache_key] = (result.copy(), copy.deepcopy(metadata))
+                if len(self._result_cache) > self._result_cache_size:
+                    self._result_cache.popitem(last=False)
+            
             return result, metadata
             
         except Exception as e:
             raise Exception(f"DuckDB query execution failed: {str(e)}")
 
+    def execute_query_arrow(self, sql: str, params: Union[Dict, Sequence] = None) -> "pa.Table":
+        """
+        Execute SQL query and return results as an Arrow table.
+        
+        Columnar transfer skips the per-value Python conversion of `fetchdf`; use it
+        when a caller only needs row counts or feeds Arrow-aware consumers.
+        """
+        try:
+            return self._execute(sql, params).fetch_arrow_table()
+        except Exception as e:
+            raise Exception(f"DuckDB query execution failed: {str(e)}")
+
+    def _execute(self, sql: str, params: Union[Dict, Sequence] = None) -> duckdb.DuckDBPyConnection:
+        """Run a statement on `conn` and invalidate caches it may have made stale; every execute path goes through here."""
+        cursor = self.conn.execute(sql, params) if params else self.conn.execute(sql)
+        
+        if _DDL_RE.search(sql):
+            self.invalidate_schema_cache()
+        if not _READ_ONLY_RE.match(sql):
+            # Writes can change any cached answer
+            self._result_cache.clear()
+        
+        return cursor
+
+    def execute_scalar(self, sql: str, params: Union[Dict, Sequence] = None) -> Optional[Tuple]:
+        """Execute SQL query and return its first row as a tuple (None if no rows), without building a DataFrame."""
+        try:
+            return self._execute(sql, params).fetchone()
+        except Exception as e:
+            raise Exception(f"DuckDB query execution failed: {str(e)}")
+
+    @staticmethod
+    def _params_key(params: Union[Dict, Sequence, None]) -> Optional[Tuple]:
+        """Build a hashable cache key for query parameters, or None if they aren't hashable."""
+        if not params:
+            return ()
+        
+        items = tuple(sorted(params.items())) if isinstance(params, dict) else tuple(params)
+        try:
+            hash(items)
+        except TypeError:
+            return None
+        return items
+
+    def invalidate_schema_cache(self) -> None:
+        """Drop cached schema metadata and query results; call after DDL or writes issued directly on `conn`."""
+        self._ddl_counter += 1
+        self._schema_cache = None
+        self._result_cache.clear()
+
     def get_schema_info(self) -> Dict[str, List[Dict]]:
         """Get schema information for all tables."""
+        if self._schema_cache is not None:
+            # Deep copy: the column lists are mutable and shared with the cache otherwise
+            return copy.deepcopy(self._schema_cache)
+        
         schema_info = {}
         
         try:
@@ -114,11 +216,13 @@ class DuckDBRunner:
                     })
                 
                 schema_info[full_table_name] = columns
+            
+            self._schema_cache = schema_info
                 
         except Exception as e:
             print(f"Warning: Could not retrieve schema info: {e}")
             
-        return schema_info
+        return copy.deepcopy(schema_info)
 
     def test_connection(self) -> bool:
         """Test database connection."""
@@ -140,6 +244,7 @@ class DuckDBRunner:
         """Create a schema if it doesn't exist."""
         try:
             self.conn.execute(f"CREATE SCHEMA IF NOT EXISTS {schema_name}")
+            self.invalidate_schema_cache()
         except Exception as e:
             print(f"Warning: Could not create schema {schema_name}: {e}")
 
@@ -152,13 +257,15 @@ class DuckDBRunner:
             
             full_table_name = f"{schema}.{table_name}" if schema != "main" else table_name
             
-            # Use DuckDB's CSV reader
+            # Use DuckDB's native CSV reader; the path is bound as a parameter
+            # so it is never spliced into the SQL text
             query = f"""
             CREATE OR REPLACE TABLE {full_table_name} AS 
-            SELECT * FROM read_csv_auto('{csv_path}', header=true)
+            SELECT * FROM read_csv_auto(?, header=true)
             """
             
-            self.conn.execute(query)
+            self.conn.execute(query, [str(csv_path)])
+            self.invalidate_schema_cache()
             print(f"Loaded {csv_path} into {full_table_name}")
             
         except Exception as e:
@@ -178,16 +285,31 @@ class DuckDBRunner:
                 
         except Exception as e:
             raise Exception(f"Failed to execute script {script_path}: {str(e)}")
+        
+        finally:
+            # Scripts typically carry DDL, and may have partly run before failing
+            self.invalidate_schema_cache()
 
     def get_query_plan(self, sql: str) -> str:
         """Get query execution plan."""
         try:
-            plan_query = f"EXPLAIN {sql}"
-            result = self.conn.execute(plan_query).fetchdf()
-            return result.to_string()
+            return self._explain(sql, self._ddl_counter)
         except Exception as e:
             return f"Could not get query plan: {str(e)}"
 
+    def _explain(self, sql: str, ddl_counter: int) -> str:
+        """Run EXPLAIN and return the physical plan text; `ddl_counter` only keys the cache."""
+        return self.conn.execute(f"EXPLAIN {sql}").fetchone()[1]
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        """
+        Open a lightweight cursor on the same database.
+        
+        A cursor has its own transaction and temp-object namespace, so TEMP tables
+        created on it are invisible to `conn` and vanish when it closes.
+        """
+        return self.conn.cursor()
+
     def close(self) -> None:
         """Close database connection."""
         if self.conn:
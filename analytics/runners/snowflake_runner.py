@@ -1,5 +1,7 @@
 """Snowflake runner for cloud data warehouse."""
 
+import tempfile
+from pathlib import Path
 from typing import Any, Dict, List, Tuple
 
 import pandas as pd
@@ -12,13 +14,19 @@ from app.config import Config
 class SnowflakeRunner:
     """Database runner for Snowflake cloud data warehouse."""
 
-    def __init__(self):
+    def __init__(self, query_tag: str = 'BI_ASSISTANT'):
         """Initialize Snowflake connection."""
         self.config = Config
+        self.query_tag = query_tag
         self.conn = None
         self.cursor = None
         self._connect()
 
+    @property
+    def connection(self):
+        """The single Snowflake connection shared by every statement this runner issues."""
+        return self.conn
+
     def _connect(self):
         """Establish connection to Snowflake."""
         try:
@@ -30,8 +38,11 @@ class SnowflakeRunner:
                 database=self.config.SNOWFLAKE_DATABASE,
                 schema=self.config.SNOWFLAKE_SCHEMA,
                 role=self.config.SNOWFLAKE_ROLE,
+                # Heartbeats keep the session token valid through long idle
+                # stretches (e.g. a dbt build), avoiding re-authentication
+                client_session_keep_alive=True,
                 session_parameters={
-                    'QUERY_TAG': 'BI_ASSISTANT',
+                    'QUERY_TAG': self.query_tag,
                     'TIMEZONE': self.config.DEFAULT_TIMEZONE
                 }
             )
@@ -184,6 +195,16 @@ class SnowflakeRunner:
         except Exception as e:
             print(f"Warning: Could not create schema {schema_name}: {e}")
 
+    def create_schemas(self, schema_names: List[str]) -> None:
+        """Create several schemas in one multi-statement request."""
+        sql = "; ".join(f"CREATE SCHEMA IF NOT EXISTS {name}" for name in schema_names)
+        try:
+            self.cursor.execute(sql, num_statements=len(schema_names))
+        except Exception:
+            # Fall back to one statement per schema so failures are reported individually
+            for schema_name in schema_names:
+                self.create_schema(schema_name)
+
     def load_dataframe_to_table(self, df: pd.DataFrame, table_name: str, schema: str = None) -> None:
         """Load pandas DataFrame into a Snowflake table."""
         try:
@@ -207,6 +228,162 @@ class SnowflakeRunner:
         except Exception as e:
             raise Exception(f"Failed to load DataFrame: {str(e)}")
 
+    def load_dataframe_via_stage(self, df: pd.DataFrame, table_name: str, schema: str = None,
+                                 parallel: int = 8) -> int:
+        """
+        Load pandas DataFrame into a Snowflake table through its table stage.
+        
+        The frame is written as a snappy Parquet file, PUT to the table's
+        internal stage and ingested with a single COPY INTO, so the data moves
+        as one bulk file instead of through per-call temporary stages.
+        
+        Returns:
+            Number of rows loaded
+        """
+        full_table_name = f"{schema}.{table_name}" if schema else table_name
+        
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                parquet_path = Path(tmp_dir) / f"{table_name.lower()}.parquet"
+                df.to_parquet(parquet_path, engine='pyarrow', compression='snappy', index=False,
+                              coerce_timestamps='us', allow_truncated_timestamps=True)
+                self._copy_parquet_into(parquet_path, df.dtypes, table_name, schema, parallel)
+            
+            print(f"Loaded {len(df)} rows into {full_table_name}")
+            return len(df)
+            
+        except Exception as e:
+            raise Exception(f"Failed to load DataFrame via stage: {str(e)}")
+
+    def load_csv_via_stage(self, csv_path: str, table_name: str, schema: str = None,
+                           chunksize: int = 100_000, parallel: int = 8, **read_csv_kwargs) -> int:
+        """
+        Stream a CSV file into a Snowflake table through its table stage.
+        
+        The CSV is read in chunks and each chunk is appended as a row group to
+        a single Parquet file, so memory stays flat regardless of file size.
+        The file is then PUT and ingested with one COPY INTO. Extra keyword
+        arguments (e.g. ``dtype``, ``parse_dates``) are passed to ``pd.read_csv``;
+        explicit dtypes skip pandas' type inference and give narrower columns.
+        
+        Returns:
+            Number of rows loaded
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        full_table_name = f"{schema}.{table_name}" if schema else table_name
+        
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                parquet_path = Path(tmp_dir) / f"{table_name.lower()}.parquet"
+                rows = 0
+                dtypes = None
+                writer = None
+                
+                try:
+                    with pd.read_csv(csv_path, chunksize=chunksize, engine='c',
+                                     low_memory=False, **read_csv_kwargs) as reader:
+                        for chunk in reader:
+                            if writer is None:
+                                # The first chunk fixes the table and file schema
+                                dtypes = chunk.dtypes
+                                arrow_schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                                writer = pq.ParquetWriter(parquet_path, arrow_schema,
+                                                          compression='snappy',
+                                                          coerce_timestamps='us',
+                                                          allow_truncated_timestamps=True)
+                            writer.write_table(
+                                pa.Table.from_pandas(chunk, schema=arrow_schema, preserve_index=False)
+                            )
+                            rows += len(chunk)
+                finally:
+                    if writer is not None:
+                        writer.close()
+                
+                if dtypes is None:
+                    raise Exception("CSV file has no data")
+                
+                self._copy_parquet_into(parquet_path, dtypes, table_name, schema, parallel)
+            
+            print(f"Loaded {rows} rows into {full_table_name}")
+            return rows
+            
+        except Exception as e:
+            raise Exception(f"Failed to load CSV {csv_path} via stage: {str(e)}")
+
+    def load_parquet_via_stage(self, parquet_path: str, table_name: str, schema: str = None,
+                               parallel: int = 8) -> int:
+        """
+        Load an existing Parquet file into a Snowflake table through its table stage.
+        
+        Only the file footer is read locally (for the table schema and row
+        count); the file itself is PUT as-is without a pandas round-trip.
+        
+        Returns:
+            Number of rows loaded
+        """
+        import pyarrow.parquet as pq
+        
+        full_table_name = f"{schema}.{table_name}" if schema else table_name
+        
+        try:
+            parquet_file = pq.ParquetFile(parquet_path)
+            dtypes = parquet_file.schema_arrow.empty_table().to_pandas().dtypes
+            rows = parquet_file.metadata.num_rows
+            
+            self._copy_parquet_into(Path(parquet_path), dtypes, table_name, schema, parallel)
+            
+            print(f"Loaded {rows} rows into {full_table_name}")
+            return rows
+            
+        except Exception as e:
+            raise Exception(f"Failed to load Parquet {parquet_path} via stage: {str(e)}")
+
+    def _copy_parquet_into(self, parquet_path: Path, dtypes: pd.Series, table_name: str,
+                           schema: str = None, parallel: int = 8) -> None:
+        """
+        Recreate the table, PUT a Parquet file to its stage and COPY it in.
+        
+        Uses its own cursor so loads for different tables can run concurrently
+        on the shared connection.
+        """
+        full_table_name = f"{schema}.{table_name}" if schema else table_name
+        stage = f"@{schema}.%{table_name}" if schema else f"@%{table_name}"
+        
+        with self.connection.cursor() as cursor:
+            # Replace the table so reruns don't duplicate rows
+            columns = ", ".join(
+                f"{col} {self._snowflake_type(dtype)}" for col, dtype in dtypes.items()
+            )
+            cursor.execute(f"CREATE OR REPLACE TABLE {full_table_name} ({columns})")
+            
+            # Parquet is already compressed, so PUT uploads it as-is
+            cursor.execute(
+                f"PUT 'file://{Path(parquet_path).as_posix()}' {stage} "
+                f"AUTO_COMPRESS=FALSE PARALLEL={parallel} OVERWRITE=TRUE"
+            )
+            
+            cursor.execute(f"""
+            COPY INTO {full_table_name} FROM {stage}
+            FILE_FORMAT = (TYPE = PARQUET)
+            MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE
+            PURGE = TRUE
+            """)
+
+    @staticmethod
+    def _snowflake_type(dtype) -> str:
+        """Map a pandas dtype to the Snowflake column type used for staged loads."""
+        if pd.api.types.is_bool_dtype(dtype):
+            return "BOOLEAN"
+        if pd.api.types.is_integer_dtype(dtype):
+            return "NUMBER(38, 0)"
+        if pd.api.types.is_float_dtype(dtype):
+            return "FLOAT"
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            return "TIMESTAMP_NTZ"
+        return "VARCHAR"
+
     def execute_script(self, script_content: str) -> None:
         """Execute a SQL script."""
         try:
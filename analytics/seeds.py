@@ -0,0 +1,43 @@
+"""Seed file definitions shared by the warehouse load scripts."""
+
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+
+SEEDS_DIR = project_root / "dbt" / "seeds"
+PARQUET_SEEDS_DIR = project_root / ".data" / "seeds"
+
+# Column types for the seed CSVs, mirroring the seed column_types in dbt_project.yml.
+# Explicit dtypes skip pandas' type inference; IDs stay strings (region 'NA' is not null).
+SEED_DTYPES = {
+    "hr_employees.csv": {
+        "employee_id": "str", "first_name": "str", "last_name": "str", "email": "str",
+        "department": "str", "job_title": "str", "gender": "str", "salary": "int32",
+        "manager_id": "str", "region_id": "str", "status": "str"
+    },
+    "hr_regions.csv": {
+        "region_id": "str", "region_name": "str", "region_code": "str",
+        "timezone": "str", "country_count": "int16"
+    },
+    "hr_attrition_events.csv": {
+        "event_id": "str", "employee_id": "str", "termination_type": "str",
+        "reason_category": "str", "voluntary": "bool", "exit_interview_completed": "bool"
+    }
+}
+
+SEED_DATE_COLUMNS = {
+    "hr_employees.csv": ["hire_date", "birth_date"],
+    "hr_attrition_events.csv": ["termination_date"]
+}
+
+
+def parquet_seed_path(csv_file: str) -> Path:
+    """Return the Parquet path for a seed CSV file name."""
+    return PARQUET_SEEDS_DIR / Path(csv_file).with_suffix(".parquet").name
+
+
+def is_parquet_seed_current(csv_file: str) -> bool:
+    """Check whether a seed's Parquet copy exists and is at least as new as its CSV."""
+    csv_path = SEEDS_DIR / csv_file
+    parquet_path = parquet_seed_path(csv_file)
+    return parquet_path.exists() and parquet_path.stat().st_mtime >= csv_path.stat().st_mtime
@@ -1,5 +1,6 @@
 """Chart generation utilities for data visualization."""
 
+import functools
 from typing import Dict, List, Optional, Tuple
 
 import altair as alt
@@ -9,6 +10,54 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
 
+@functools.lru_cache(maxsize=128)
+def _select_chart_type(n_rows: int, columns: Tuple, dtypes: Tuple) -> str:
+    """Select a chart type from a frame's signature (row count, columns, dtypes)."""
+    # Check for single value (KPI)
+    if n_rows == 1 and len(columns) <= 3:
+        return 'kpi'
+    
+    # Analyze column types (same buckets as DataFrame.select_dtypes)
+    numeric_cols = [
+        col for col, dtype in zip(columns, dtypes)
+        if (pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype))
+        or pd.api.types.is_timedelta64_dtype(dtype)
+    ]
+    date_cols = [
+        col for col, dtype in zip(columns, dtypes) if pd.api.types.is_datetime64_dtype(dtype)
+    ]
+    categorical_cols = [
+        col for col, dtype in zip(columns, dtypes)
+        if pd.api.types.is_object_dtype(dtype) or isinstance(dtype, pd.CategoricalDtype)
+    ]
+    
+    # Time series data
+    if len(date_cols) >= 1 and len(numeric_cols) >= 1:
+        return 'line'
+    
+    # Single categorical + numeric = bar chart
+    if len(categorical_cols) == 1 and len(numeric_cols) >= 1:
+        # Pie chart for percentages or small categories
+        if n_rows <= 8 and any('pct' in col.lower() or 'percent' in col.lower() 
+                               or 'rate' in col.lower() for col in numeric_cols):
+            return 'pie'
+        return 'bar'
+    
+    # Two numerics = scatter plot
+    if len(numeric_cols) >= 2 and len(categorical_cols) <= 1:
+        return 'scatter'
+    
+    # Multiple categories and numerics = heatmap
+    if len(categorical_cols) >= 2 and len(numeric_cols) >= 1:
+        return 'heatmap'
+    
+    # Default to table for complex data
+    if len(columns) > 6 or n_rows > 50:
+        return 'table'
+    
+    return 'bar'  # Default fallback
+
+
 class ChartGenerator:
     """Generate charts from query results with automatic type detection."""
 
@@ -27,40 +76,9 @@ class ChartGenerator:
         if df.empty:
             return 'table'
         
-        # Check for single value (KPI)
-        if len(df) == 1 and len(df.columns) <= 3:
-            return 'kpi'
-        
-        # Analyze column types
-        numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
-        date_cols = df.select_dtypes(include=['datetime64', 'datetime']).columns.tolist()
-        categorical_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
-        
-        # Time series data
-        if len(date_cols) >= 1 and len(numeric_cols) >= 1:
-            return 'line'
-        
-        # Single categorical + numeric = bar chart
-        if len(categorical_cols) == 1 and len(numeric_cols) >= 1:
-            # Pie chart for percentages or small categories
-            if len(df) <= 8 and any('pct' in col.lower() or 'percent' in col.lower() 
-                                   or 'rate' in col.lower() for col in numeric_cols):
-                return 'pie'
-            return 'bar'
-        
-        # Two numerics = scatter plot
-        if len(numeric_cols) >= 2 and len(categorical_cols) <= 1:
-            return 'scatter'
-        
-        # Multiple categories and numerics = heatmap
-        if len(categorical_cols) >= 2 and len(numeric_cols) >= 1:
-            return 'heatmap'
-        
-        # Default to table for complex data
-        if len(df.columns) > 6 or len(df) > 50:
-            return 'table'
-        
-        return 'bar'  # Default fallback
+        # The choice depends only on shape, column names and dtypes, so it is
+        # memoized on that signature rather than re-inspecting the frame
+        return _select_chart_type(len(df), tuple(df.columns), tuple(df.dtypes))
 
     def create_chart(self, df: pd.DataFrame, chart_type: str = None, title: str = None, 
                     metadata: Dict = None, **kwargs) -> Tuple[str, Optional[str]]:
@@ -1,8 +1,13 @@
 """Streamlit chart components."""
 
-import json
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 
+try:
+    from orjson import loads as json_loads
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    from json import loads as json_loads
+
+import numpy as np
 import streamlit as st
 import pandas as pd
 import altair as alt
@@ -12,6 +17,42 @@ import plotly.graph_objects as go
 from analytics.viz.charts import ChartGenerator
 
 
+def df_cache_key(df: pd.DataFrame) -> Tuple:
+    """
+    Build a stable cache key for a result DataFrame.
+    
+    Combines the schema and row count with a vectorized content hash, so
+    identical results share cache entries across reruns while results that
+    merely have the same shape do not collide.
+    """
+    content_hash = 0
+    if len(df):
+        try:
+            content_hash = int(pd.util.hash_pandas_object(df, index=False).sum())
+        except TypeError:
+            # LIST/STRUCT columns (e.g. array_agg results) hold unhashable values;
+            # hash their string form instead, as Streamlit's own hasher does
+            content_hash = int(pd.util.hash_pandas_object(df.astype(str), index=False).sum())
+    return (
+        tuple(df.columns),
+        tuple(df.dtypes.astype(str)),
+        len(df),
+        content_hash
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=64, ttl=3600)
+def _create_chart_spec(df_key: Tuple, _df: pd.DataFrame, chart_type: str, title: str = None,
+                       _metadata: Dict = None) -> Tuple[str, Optional[str]]:
+    """
+    Build the serialized chart spec, cached on ``df_key`` rather than hashing ``_df``.
+    
+    ``_metadata`` stays out of the key: it carries per-run flags such as
+    ``cache_hit``, and with ``chart_type`` given it does not affect the chart.
+    """
+    return ChartGenerator().create_chart(_df, chart_type, title, _metadata)
+
+
 def display_chart(df: pd.DataFrame, chart_type: str = None, title: str = None, 
                  metadata: Dict = None, key: str = None) -> None:
     """
@@ -28,22 +69,20 @@ def display_chart(df: pd.DataFrame, chart_type: str = None, title: str = None,
         st.warning("No data to display")
         return
     
-    chart_gen = ChartGenerator()
-    
     # Auto-select chart type if not provided
     if not chart_type:
-        chart_type = chart_gen.auto_select_chart_type(df, metadata)
+        chart_type = ChartGenerator().auto_select_chart_type(df, metadata)
     
-    # Generate chart
-    library, chart_data = chart_gen.create_chart(df, chart_type, title, metadata)
+    # Generate chart (serialized spec is cached, so reruns skip regeneration)
+    library, chart_data = _create_chart_spec(df_cache_key(df), df, chart_type, title, metadata)
     
     # Display based on library
     if library == 'altair':
-        chart_json = json.loads(chart_data)
+        chart_json = json_loads(chart_data)
         st.altair_chart(alt.Chart.from_dict(chart_json), use_container_width=True)
     
     elif library == 'plotly':
-        fig = plotly.graph_objects.Figure(json.loads(chart_data))
+        fig = plotly.graph_objects.Figure(json_loads(chart_data))
         st.plotly_chart(fig, use_container_width=True, key=key)
     
     elif library == 'table':
@@ -209,34 +248,41 @@ def chart_insights_panel(df: pd.DataFrame, chart_type: str, metadata: Dict = Non
     # Chart-specific insights
     if chart_type == 'line' and len(numeric_cols) > 0:
         # Find trends
-        for col in numeric_cols[:2]:  # Limit to first 2 numeric columns
-            if len(df) > 1:
-                first_val = df[col].iloc[0]
-                last_val = df[col].iloc[-1]
-                if pd.notna(first_val) and pd.notna(last_val) and first_val != 0:
-                    change_pct = ((last_val - first_val) / first_val) * 100
-                    trend = "📈" if change_pct > 0 else "📉"
-                    insights.append(f"{trend} {col.replace('_', ' ').title()}: {change_pct:+.1f}% change")
+        if len(df) > 1:
+            trend_cols = numeric_cols[:2]  # Limit to first 2 numeric columns
+            endpoints = df[trend_cols].iloc[[0, -1]].to_numpy(dtype=np.float64, na_value=np.nan)
+            first_vals, last_vals = endpoints[0], endpoints[1]
+            valid = np.isfinite(first_vals) & np.isfinite(last_vals) & (first_vals != 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                change_pcts = (last_vals - first_vals) / first_vals * 100
+            
+            for i in np.flatnonzero(valid):
+                col, change_pct = trend_cols[i], change_pcts[i]
+                trend = "📈" if change_pct > 0 else "📉"
+                insights.append(f"{trend} {col.replace('_', ' ').title()}: {change_pct:+.1f}% change")
     
     elif chart_type == 'bar' and len(numeric_cols) > 0:
         # Find top performers
         col = numeric_cols[0]
         categorical_col = df.select_dtypes(include=['object', 'category']).columns
-        if len(categorical_col) > 0:
+        values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        if len(categorical_col) > 0 and not np.isnan(values).all():
             cat_col = categorical_col[0]
-            top_value = df.loc[df[col].idxmax(), cat_col]
+            top_value = df[cat_col].iat[np.nanargmax(values)]
             insights.append(f"🏆 Highest {col.replace('_', ' ').title()}: {top_value}")
     
     elif chart_type == 'pie':
         # Find largest segment
-        if len(numeric_cols) > 0 and len(df.select_dtypes(include=['object']).columns) > 0:
+        object_cols = df.select_dtypes(include=['object']).columns
+        if len(numeric_cols) > 0 and len(object_cols) > 0:
             val_col = numeric_cols[0]
-            cat_col = df.select_dtypes(include=['object']).columns[0]
-            total = df[val_col].sum()
-            largest_idx = df[val_col].idxmax()
-            largest_cat = df.loc[largest_idx, cat_col]
-            largest_pct = (df.loc[largest_idx, val_col] / total) * 100
-            insights.append(f"🥇 Largest segment: {largest_cat} ({largest_pct:.1f}%)")
+            cat_col = object_cols[0]
+            values = df[val_col].to_numpy(dtype=np.float64, na_value=np.nan)
+            if not np.isnan(values).all():
+                largest_pos = np.nanargmax(values)
+                largest_cat = df[cat_col].iat[largest_pos]
+                largest_pct = (values[largest_pos] / np.nansum(values)) * 100
+                insights.append(f"🥇 Largest segment: {largest_cat} ({largest_pct:.1f}%)")
     
     # Display insights
     if insights:
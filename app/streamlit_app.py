@@ -2,7 +2,9 @@
 
 import os
 import traceback
-from typing import Dict, Optional
+from collections import deque
+from itertools import islice
+from typing import Dict, Optional, Tuple
 
 import streamlit as st
 import pandas as pd
@@ -12,11 +14,12 @@ from app.config import Config, WarehouseType
 from app.components.charts import (
     display_chart, chart_type_selector, download_buttons,
     query_metadata_display, data_preview, chart_insights_panel,
-    empty_state_message
+    empty_state_message, df_cache_key
 )
 from analytics.nl2sql.agent import create_agent
 from analytics.runners import create_runner, get_available_warehouses
 from analytics.insights.suggest import InsightGenerator
+from analytics.viz.charts import ChartGenerator
 
 # Page configuration
 st.set_page_config(
@@ -26,8 +29,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS
-st.markdown("""
+# Custom CSS (re-emitted every run: Streamlit drops elements a rerun doesn't render)
+CUSTOM_CSS = """
 <style>
     .main-header {
         font-size: 2.5rem;
@@ -57,11 +60,16 @@ st.markdown("""
         margin: 0.5rem 0;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+
+# Maximum number of queries kept in the session history
+MAX_QUERY_HISTORY = 50
 
 # Initialize session state
 if 'query_history' not in st.session_state:
-    st.session_state.query_history = []
+    st.session_state.query_history = deque(maxlen=MAX_QUERY_HISTORY)
+    st.session_state.query_history_set = set()
 if 'current_results' not in st.session_state:
     st.session_state.current_results = None
 if 'warehouse_runner' not in st.session_state:
@@ -70,6 +78,12 @@ if 'agent' not in st.session_state:
     st.session_state.agent = None
 
 
+@st.cache_resource
+def get_insight_generator() -> InsightGenerator:
+    """Get a shared insight generator so the LLM client is built only once."""
+    return InsightGenerator()
+
+
 def initialize_connections():
     """Initialize database and agent connections."""
     try:
@@ -146,7 +160,7 @@ def sidebar():
     # Query history
     if st.session_state.query_history:
         st.sidebar.markdown("### 📚 Recent Queries")
-        for i, query in enumerate(reversed(st.session_state.query_history[-5:])):
+        for i, query in enumerate(islice(reversed(st.session_state.query_history), 5)):
             if st.sidebar.button(f"🔄 {query[:30]}...", key=f"history_{i}"):
                 st.session_state.example_query = query
     
@@ -231,7 +245,7 @@ def process_query(query: str):
                 df, metadata = st.session_state.warehouse_runner.execute_query(sql)
             
             # Generate insights
-            insight_gen = InsightGenerator()
+            insight_gen = get_insight_generator()
             narrative = insight_gen.generate_narrative(df, query, sql, metadata)
             follow_ups = insight_gen.generate_follow_up_questions(df, query, sql)
             
@@ -245,9 +259,13 @@ def process_query(query: str):
                 'follow_ups': follow_ups
             }
             
-            # Add to history
-            if query not in st.session_state.query_history:
-                st.session_state.query_history.append(query)
+            # Add to history (set mirrors the deque for O(1) membership)
+            if query not in st.session_state.query_history_set:
+                history = st.session_state.query_history
+                if len(history) == history.maxlen:
+                    st.session_state.query_history_set.discard(history[0])
+                history.append(query)
+                st.session_state.query_history_set.add(query)
             
             st.success(f"✅ Found {len(df):,} results")
             
@@ -261,7 +279,6 @@ def display_results():
     """Display query results with visualizations and insights."""
     results = st.session_state.current_results
     df = results['data']
-    metadata = results['metadata']
     
     if df.empty:
         empty_state_message()
@@ -270,85 +287,125 @@ def display_results():
     # Create tabs for different views
     tab1, tab2, tab3, tab4 = st.tabs(["📊 Visualization", "📋 Data", "💡 Insights", "🔍 Details"])
     
+    # Each tab is a fragment so widget interactions only rerun that tab
     with tab1:
-        # Chart type selector and visualization
-        chart_type = chart_type_selector(df, key="main_chart_selector")
-        
-        # Display chart
-        display_chart(
-            df, 
-            chart_type=chart_type, 
-            title=results['query'],
-            metadata=metadata,
-            key="main_chart"
-        )
-        
-        # Download buttons
-        download_buttons(df, chart_type, title="query_results")
-        
-        # Quick insights panel
-        chart_insights_panel(df, chart_type, metadata)
+        visualization_tab(results)
     
     with tab2:
-        # Data preview
-        st.markdown("### 📋 Query Results")
-        data_preview(df, max_rows=100)
-        
-        # Basic statistics for numeric columns
-        numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
-        if numeric_cols:
-            st.markdown("### 📈 Summary Statistics")
-            st.dataframe(df[numeric_cols].describe(), use_container_width=True)
+        data_tab(df)
     
     with tab3:
-        # Narrative insights
-        if results.get('narrative'):
-            st.markdown("### 📖 What the data tells us")
-            st.markdown(f"💬 {results['narrative']}")
-        
-        # Follow-up questions
-        if results.get('follow_ups'):
-            st.markdown("### 🤔 Explore further")
-            st.markdown("*Click on any question below to run it:*")
-            
-            for i, question in enumerate(results['follow_ups']):
-                if st.button(f"❓ {question}", key=f"followup_{i}"):
-                    st.session_state.example_query = question
-                    st.rerun()
-        
-        # Key insights
-        try:
-            insight_gen = InsightGenerator()
-            key_insights = insight_gen.generate_key_insights(df, chart_type)
-            
-            if key_insights:
-                st.markdown("### 🎯 Key Insights")
-                for insight in key_insights:
-                    icon = "📊" if insight['type'] == 'info' else "📈" if insight['type'] == 'success' else "⚠️"
-                    st.markdown(f"{icon} **{insight['title']}**: {insight['value']}")
-        except Exception as e:
-            if Config.DEBUG:
-                st.error(f"Error generating insights: {e}")
+        insights_tab(results)
     
     with tab4:
-        # Query metadata
-        query_metadata_display(metadata)
-        
-        # SQL query details
-        st.markdown("### 🔍 Query Details")
-        st.markdown(f"**Original Question:** {results['query']}")
+        details_tab(results)
+
+
+@st.fragment
+def visualization_tab(results: Dict):
+    """Render chart type selector, chart, downloads and quick insights."""
+    df = results['data']
+    metadata = results['metadata']
+    
+    # Chart type selector and visualization
+    chart_type = chart_type_selector(df, key="main_chart_selector")
+    
+    # Display chart
+    display_chart(
+        df, 
+        chart_type=chart_type, 
+        title=results['query'],
+        metadata=metadata,
+        key="main_chart"
+    )
+    
+    # Download buttons
+    download_buttons(df, chart_type, title="query_results")
+    
+    # Quick insights panel
+    chart_insights_panel(df, chart_type, metadata)
+
+
+@st.fragment
+def data_tab(df: pd.DataFrame):
+    """Render data preview and summary statistics."""
+    # Data preview
+    st.markdown("### 📋 Query Results")
+    data_preview(df, max_rows=100)
+    
+    # Basic statistics for numeric columns
+    numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+    if numeric_cols:
+        with st.expander("📈 Summary Statistics", expanded=False):
+            numeric_df = df[numeric_cols]
+            st.dataframe(summary_statistics(df_cache_key(numeric_df), numeric_df), use_container_width=True)
+
+
+@st.cache_data(show_spinner=False, max_entries=64, ttl=3600)
+def summary_statistics(df_key: Tuple, _df: pd.DataFrame) -> pd.DataFrame:
+    """Compute describe() once per distinct result set."""
+    return _df.describe()
+
+
+@st.fragment
+def insights_tab(results: Dict):
+    """Render narrative, follow-up questions and key insights."""
+    df = results['data']
+    
+    # Narrative insights
+    if results.get('narrative'):
+        st.markdown("### 📖 What the data tells us")
+        st.markdown(f"💬 {results['narrative']}")
+    
+    # Follow-up questions
+    if results.get('follow_ups'):
+        st.markdown("### 🤔 Explore further")
+        st.markdown("*Click on any question below to run it:*")
         
-        with st.expander("Generated SQL Query", expanded=False):
-            st.code(results['sql'], language="sql")
+        for i, question in enumerate(results['follow_ups']):
+            if st.button(f"❓ {question}", key=f"followup_{i}"):
+                st.session_state.example_query = question
+                st.rerun()
+    
+    # Key insights
+    try:
+        insight_gen = get_insight_generator()
+        # Use the auto-selected chart type so this fragment does not depend on the
+        # selector; insights for the selected chart render in the visualization tab
+        chart_type = ChartGenerator().auto_select_chart_type(df, results['metadata'])
+        key_insights = insight_gen.generate_key_insights(df, chart_type)
         
-        # Execution plan (if available)
-        if hasattr(st.session_state.warehouse_runner, 'get_query_plan'):
-            with st.expander("Query Execution Plan", expanded=False):
-                try:
-                    plan = st.session_state.warehouse_runner.get_query_plan(results['sql'])
-                    st.text(plan)
-                except Exception as e:
-                    st.text(f"Could not retrieve execution plan: {e}")
+        if key_insights:
+            st.markdown("### 🎯 Key Insights")
+            for insight in key_insights:
+                icon = "📊" if insight['type'] == 'info' else "📈" if insight['type'] == 'success' else "⚠️"
+                st.markdown(f"{icon} **{insight['title']}**: {insight['value']}")
+    except Exception as e:
+        if Config.DEBUG:
+            st.error(f"Error generating insights: {e}")
+
+
+@st.fragment
+def details_tab(results: Dict):
+    """Render query metadata, SQL and execution plan."""
+    # Query metadata
+    query_metadata_display(results['metadata'])
+    
+    # SQL query details
+    st.markdown("### 🔍 Query Details")
+    st.markdown(f"**Original Question:** {results['query']}")
+    
+    with st.expander("Generated SQL Query", expanded=False):
+        st.code(results['sql'], language="sql")
+    
+    # Execution plan (if available)
+    if hasattr(st.session_state.warehouse_runner, 'get_query_plan'):
+        with st.expander("Query Execution Plan", expanded=False):
+            try:
+                plan = st.session_state.warehouse_runner.get_query_plan(results['sql'])
+                st.text(plan)
+            except Exception as e:
+                st.text(f"Could not retrieve execution plan: {e}")
 
 
 def main():
@@ -1,20 +1,86 @@
 """Evaluation harness for NL→SQL translation quality."""
 
+import atexit
+import copy
+import functools
 import os
 import yaml
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import TYPE_CHECKING, Dict, List, Tuple, Optional
 import json
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
-import pandas as pd
-import sqlglot
-from sqlglot import parse_one, transpile
+# pandas, sqlglot, rapidfuzz and the agent stack are imported where they are
+# used, so `--history` does not pay for loading them
+if TYPE_CHECKING:
+    import pandas as pd
 
-from analytics.nl2sql.agent import create_agent
-from analytics.runners.duckdb_runner import DuckDBRunner
-from analytics.nl2sql.guardrails import SQLGuardrails
+
+# Plain INSERTs: run_id is unique per run, so REPLACE semantics are never needed
+_SQL_INSERT_RUN = """
+INSERT INTO evaluation_runs 
+(run_id, timestamp, total_cases, passed_cases, failed_cases, overall_score, notes)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+_SQL_INSERT_CASE = """
+INSERT INTO case_results 
+(run_id, case_id, question, generated_sql, expected_sql, execution_success,
+ sql_similarity_score, schema_compliance_score, result_accuracy_score,
+ overall_case_score, error_message, execution_time_ms)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+@functools.lru_cache(maxsize=100)
+def _parse_yaml(path: str, mtime: float, size: int) -> Dict:
+    """Parse a YAML file; mtime and size are part of the key so edits invalidate it."""
+    with open(path, 'r') as f:
+        return yaml.safe_load(f) or {}
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_sql_cached(sql: str, dialect: str = "duckdb"):
+    """Parse SQL once per distinct string; callers must treat the AST as read-only."""
+    from sqlglot import parse_one
+    
+    return parse_one(sql, dialect=dialect)
+
+
+@functools.lru_cache(maxsize=1024)
+def _normalize_sql_cached(sql: str) -> str:
+    """Normalize SQL for comparison (cached per distinct string)."""
+    try:
+        # Parse and format consistently
+        parsed = _parse_sql_cached(sql)
+        normalized = parsed.sql(dialect="duckdb", pretty=True)
+        return normalized.upper()
+    except:
+        # Fallback to simple normalization
+        return " ".join(sql.upper().split())
+
+
+@functools.lru_cache(maxsize=1024)
+def _extract_table_references_cached(sql: str) -> Tuple[str, ...]:
+    """Extract table references from SQL (cached per distinct string)."""
+    # Always use the parser: a FROM/JOIN regex also matches EXTRACT(... FROM col)
+    # and TRIM(... FROM col). The AST is shared with normalization via _parse_sql_cached.
+    try:
+        import sqlglot
+        
+        parsed = _parse_sql_cached(sql)
+        tables = []
+        for table in parsed.find_all(sqlglot.expressions.Table):
+            if table.name:
+                parts = [part for part in (table.catalog, table.db, table.name) if part]
+                tables.append(".".join(parts))
+        return tuple(tables)
+    except:
+        return ()
 
 
 class NL2SQLEvaluator:
@@ -24,25 +90,56 @@ class NL2SQLEvaluator:
         """Initialize evaluator with test cases."""
         self.test_cases_file = Path(test_cases_file)
         self.test_cases = self._load_test_cases()
+        self._test_cases_by_id = {tc["id"]: tc for tc in self.test_cases}
         self.results_db = Path("eval/results.db")
+        self._db_lock = threading.Lock()
+        self._conn = self._open_results_db()
+        atexit.register(self.close)
         self._init_results_db()
 
+    def _open_results_db(self) -> sqlite3.Connection:
+        """Open the results database connection reused for the evaluator's lifetime."""
+        self.results_db.parent.mkdir(parents=True, exist_ok=True)
+        
+        # Autocommit mode; transactions are managed explicitly
+        conn = sqlite3.connect(self.results_db, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def close(self) -> None:
+        """Close the results database connection."""
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
     def _load_test_cases(self) -> List[Dict]:
         """Load test cases from YAML file."""
         if not self.test_cases_file.exists():
             raise FileNotFoundError(f"Test cases file not found: {self.test_cases_file}")
         
-        with open(self.test_cases_file, 'r') as f:
-            data = yaml.safe_load(f)
+        stat = self.test_cases_file.stat()
+        data = _parse_yaml(str(self.test_cases_file.resolve()), stat.st_mtime, stat.st_size)
+        
+        # Copy so callers can't mutate the cached structure
+        test_cases = copy.deepcopy(data.get('test_cases', []))
         
-        return data.get('test_cases', [])
+        # Pre-normalize expectations once instead of per evaluation
+        for test_case in test_cases:
+            test_case['_expected_tables'] = tuple(test_case.get('expected_tables', []))
+            test_case['_expected_aggregations_upper'] = tuple(
+                agg.upper() for agg in test_case.get('expected_aggregations', [])
+            )
+            test_case['_expected_filters_lower'] = tuple(
+                filter_col.lower() for filter_col in test_case.get('expected_filters', [])
+            )
+        
+        return test_cases
 
     def _init_results_db(self):
         """Initialize SQLite database for storing evaluation results."""
-        self.results_db.parent.mkdir(parents=True, exist_ok=True)
-        
-        conn = sqlite3.connect(self.results_db)
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
         
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS evaluation_runs (
@@ -73,9 +170,6 @@ class NL2SQLEvaluator:
             FOREIGN KEY (run_id) REFERENCES evaluation_runs (run_id)
         )
         """)
-        
-        conn.commit()
-        conn.close()
 
     def run_evaluation(self, run_id: str = None) -> Dict:
         """Run complete evaluation suite."""
@@ -87,8 +181,12 @@ class NL2SQLEvaluator:
         
         # Initialize components
         try:
+            from analytics.nl2sql.agent import NL2SQLAgent, create_agent
+            from analytics.runners.duckdb_runner import DuckDBRunner
+            
             db_runner = DuckDBRunner()
-            agent = create_agent(db_runner)
+            # Builds the schema index (if missing) once, before any worker starts
+            create_agent(db_runner)
         except Exception as e:
             print(f"❌ Failed to initialize components: {e}")
             return {"error": str(e)}
@@ -103,21 +201,50 @@ class NL2SQLEvaluator:
             "overall_score": 0.0
         }
         
-        # Run each test case
-        for i, test_case in enumerate(self.test_cases, 1):
-            print(f"\n📝 Running case {i}/{len(self.test_cases)}: {test_case['id']}")
-            
-            case_result = self._evaluate_single_case(test_case, agent, db_runner)
-            results["case_results"].append(case_result)
+        # Run test cases concurrently; LLM calls dominate and release the GIL.
+        # Thread-safety:
+        # - each worker thread lazily builds its own NL2SQLAgent (a failed build is
+        #   recorded on the case and retried by the next one), so the LLM client,
+        #   guardrails (and their validation cache) and SchemaIndex wrapper are never shared;
+        # - the agents' Chroma clients share one process-wide system per path, which
+        #   chromadb 0.4 guards with per-thread SQLite connections; workers only read it;
+        # - the DuckDB runner is shared and every use goes through self._db_lock;
+        # - module-level lru_caches are thread-safe, and results are saved on this thread.
+        max_workers = max(1, int(os.environ.get("EVAL_WORKERS", "4")))
+        case_results = [None] * len(self.test_cases)
+        worker_state = threading.local()
+        
+        def worker_agent():
+            if not hasattr(worker_state, "agent"):
+                worker_state.agent = NL2SQLAgent(db_runner)
+            return worker_state.agent
+        
+        def evaluate_in_worker(test_case: Dict) -> Dict:
+            return self._evaluate_single_case(test_case, worker_agent, db_runner)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(evaluate_in_worker, test_case): idx
+                for idx, test_case in enumerate(self.test_cases)
+            }
             
-            if case_result["overall_case_score"] >= 0.7:  # 70% threshold for pass
-                results["passed_cases"] += 1
-                print(f"✅ PASSED (Score: {case_result['overall_case_score']:.2f})")
-            else:
-                results["failed_cases"] += 1
-                print(f"❌ FAILED (Score: {case_result['overall_case_score']:.2f})")
-                if case_result.get("error_message"):
-                    print(f"   Error: {case_result['error_message']}")
+            for i, future in enumerate(as_completed(futures), 1):
+                idx = futures[future]
+                case_result = future.result()
+                case_results[idx] = case_result
+                print(f"\n📝 Finished case {i}/{len(self.test_cases)}: {case_result['case_id']}")
+                
+                if case_result["overall_case_score"] >= 0.7:  # 70% threshold for pass
+                    results["passed_cases"] += 1
+                    print(f"✅ PASSED (Score: {case_result['overall_case_score']:.2f})")
+                else:
+                    results["failed_cases"] += 1
+                    print(f"❌ FAILED (Score: {case_result['overall_case_score']:.2f})")
+                    if case_result.get("error_message"):
+                        print(f"   Error: {case_result['error_message']}")
+        
+        # Keep results in test-case order regardless of completion order
+        results["case_results"] = case_results
         
         # Calculate overall score
         if results["case_results"]:
@@ -133,8 +260,13 @@ class NL2SQLEvaluator:
         
         return results
 
-    def _evaluate_single_case(self, test_case: Dict, agent, db_runner) -> Dict:
-        """Evaluate a single test case."""
+    def _evaluate_single_case(self, test_case: Dict, get_agent, db_runner) -> Dict:
+        """
+        Evaluate a single test case.
+        
+        `get_agent` returns an agent owned by the calling thread; it is called inside
+        the case's error handling, so an agent that fails to build fails only this case.
+        """
         case_id = test_case["id"]
         question = test_case["question"]
         
@@ -152,10 +284,11 @@ class NL2SQLEvaluator:
             "execution_time_ms": 0
         }
         
-        start_time = datetime.now()
+        start_ns = time.perf_counter_ns()
         
         try:
             # Generate SQL
+            agent = get_agent()
             success, generated_sql, error = agent.translate_to_sql(question)
             
             if not success:
@@ -181,7 +314,9 @@ class NL2SQLEvaluator:
             
             # Execute SQL and evaluate results
             try:
-                df, metadata = db_runner.execute_query(generated_sql)
+                # DuckDB connections are not safe to share across threads
+                with self._db_lock:
+                    df, metadata = db_runner.execute_query(generated_sql)
                 result["execution_success"] = True
                 result["result_accuracy_score"] = self._evaluate_result_accuracy(
                     df, test_case
@@ -206,8 +341,7 @@ class NL2SQLEvaluator:
             result["error_message"] = f"Evaluation error: {str(e)}"
         
         finally:
-            end_time = datetime.now()
-            result["execution_time_ms"] = int((end_time - start_time).total_seconds() * 1000)
+            result["execution_time_ms"] = (time.perf_counter_ns() - start_ns) // 1_000_000
         
         return result
 
@@ -217,36 +351,40 @@ class NL2SQLEvaluator:
         max_score = 100.0
         
         try:
-            # Parse SQL
-            parsed = parse_one(sql, dialect="duckdb")
+            expected_tables = test_case.get("_expected_tables") or test_case.get("expected_tables", [])
+            expected_aggs = test_case.get("_expected_aggregations_upper") or [
+                agg.upper() for agg in test_case.get("expected_aggregations", [])
+            ]
+            expected_filters = test_case.get("_expected_filters_lower") or [
+                filter_col.lower() for filter_col in test_case.get("expected_filters", [])
+            ]
+            
+            # Parse SQL (guardrail-only cases have nothing to match against the AST)
+            if expected_tables or expected_aggs or expected_filters:
+                _parse_sql_cached(sql)
             
             # Check for expected tables
-            expected_tables = test_case.get("expected_tables", [])
             if expected_tables:
-                found_tables = self._extract_table_references(sql)
-                table_matches = sum(
-                    1 for table in expected_tables 
-                    if any(table in found_table for found_table in found_tables)
-                )
+                # Table names never contain spaces, so one joined string stands in for the list
+                found_tables_joined = " ".join(self._extract_table_references(sql))
+                table_matches = sum(1 for table in expected_tables if table in found_tables_joined)
                 score += (table_matches / len(expected_tables)) * 30
             
             # Check for expected aggregations
-            expected_aggs = test_case.get("expected_aggregations", [])
             if expected_aggs:
                 sql_upper = sql.upper()
                 agg_matches = sum(1 for agg in expected_aggs if agg in sql_upper)
                 score += (agg_matches / len(expected_aggs)) * 20
             
             # Check for filters
-            expected_filters = test_case.get("expected_filters", [])
             if expected_filters:
-                filter_matches = sum(
-                    1 for filter_col in expected_filters 
-                    if filter_col.lower() in sql.lower()
-                )
+                sql_lower = sql.lower()
+                filter_matches = sum(1 for filter_col in expected_filters if filter_col in sql_lower)
                 score += (filter_matches / len(expected_filters)) * 25
             
             # SQL safety checks
+            from analytics.nl2sql.guardrails import SQLGuardrails
+            
             guardrails = SQLGuardrails()
             is_valid, error, _ = guardrails.validate_sql(sql)
             if is_valid:
@@ -260,19 +398,22 @@ class NL2SQLEvaluator:
     def _evaluate_sql_similarity(self, generated_sql: str, expected_sql: str) -> float:
         """Evaluate similarity between generated and expected SQL."""
         try:
+            # Identical up to case and whitespace: skip the sqlglot round-trip
+            cheap_exp = " ".join(expected_sql.upper().split())
+            if cheap_exp and " ".join(generated_sql.upper().split()) == cheap_exp:
+                return 1.0
+            
             # Normalize both SQL queries
             gen_normalized = self._normalize_sql(generated_sql)
             exp_normalized = self._normalize_sql(expected_sql)
             
-            # Simple similarity based on common keywords and structure
-            gen_tokens = set(gen_normalized.split())
-            exp_tokens = set(exp_normalized.split())
-            
-            if not exp_tokens:
+            if not exp_normalized:
                 return 0.0
             
-            intersection = gen_tokens.intersection(exp_tokens)
-            similarity = len(intersection) / len(exp_tokens)
+            # Order-aware edit-distance similarity (Indel ratio, computed in C)
+            from rapidfuzz import fuzz
+            
+            similarity = fuzz.ratio(gen_normalized, exp_normalized) / 100.0
             
             return min(similarity, 1.0)
             
@@ -280,91 +421,52 @@ class NL2SQLEvaluator:
             print(f"SQL similarity evaluation error: {e}")
             return 0.0
 
-    def _evaluate_result_accuracy(self, df: pd.DataFrame, test_case: Dict) -> float:
+    def _evaluate_result_accuracy(self, df: "pd.DataFrame", test_case: Dict) -> float:
         """Evaluate accuracy of query results."""
         score = 0.0
         
         # Basic result validation
-        if df.empty:
+        n_rows, n_cols = df.shape
+        if n_rows == 0 or n_cols == 0:
             return 0.0
         
         # Check for expected columns
         expected_columns = test_case.get("expected_columns", [])
         if expected_columns:
-            df_columns_lower = [col.lower() for col in df.columns]
+            df_columns_lower = set(df.columns.astype(str).str.lower())
+            expected_lower = {col.lower() for col in expected_columns}
+            # Exact matches via set intersection; only the rest need a substring scan
+            exact = expected_lower & df_columns_lower
             column_matches = sum(
-                1 for col in expected_columns 
-                if any(col.lower() in df_col for df_col in df_columns_lower)
+                1 for col in expected_columns
+                if col.lower() in exact
+                or any(col.lower() in df_col for df_col in df_columns_lower)
             )
             score += (column_matches / len(expected_columns)) * 0.6
         
         # Check result reasonableness
-        if len(df) > 0:
+        if n_rows > 0:
             score += 0.2  # Non-empty result
         
-        if len(df.columns) >= 2:
+        if n_cols >= 2:
             score += 0.2  # Multiple columns (indicates proper joins/grouping)
         
         return min(score, 1.0)
 
     def _normalize_sql(self, sql: str) -> str:
         """Normalize SQL for comparison."""
-        try:
-            # Parse and format consistently
-            parsed = parse_one(sql, dialect="duckdb")
-            normalized = parsed.sql(dialect="duckdb", pretty=True)
-            return normalized.upper()
-        except:
-            # Fallback to simple normalization
-            return " ".join(sql.upper().split())
+        return _normalize_sql_cached(sql)
 
     def _extract_table_references(self, sql: str) -> List[str]:
         """Extract table references from SQL."""
-        try:
-            parsed = parse_one(sql, dialect="duckdb")
-            tables = []
-            for table in parsed.find_all(sqlglot.expressions.Table):
-                if table.name:
-                    schema_table = ""
-                    if table.db:
-                        schema_table += table.db + "."
-                    if table.catalog:
-                        schema_table = table.catalog + "." + schema_table
-                    schema_table += table.name
-                    tables.append(schema_table)
-            return tables
-        except:
-            return []
+        return list(_extract_table_references_cached(sql))
 
     def _save_results(self, results: Dict):
         """Save evaluation results to database."""
-        conn = sqlite3.connect(self.results_db)
-        cursor = conn.cursor()
+        conn = self._conn
         
-        # Save run summary
-        cursor.execute("""
-        INSERT INTO evaluation_runs 
-        (run_id, timestamp, total_cases, passed_cases, failed_cases, overall_score, notes)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            results["run_id"],
-            results["timestamp"],
-            results["total_cases"],
-            results["passed_cases"],
-            results["failed_cases"],
-            results["overall_score"],
-            f"Automated evaluation run"
-        ))
-        
-        # Save individual case results
-        for case_result in results["case_results"]:
-            cursor.execute("""
-            INSERT INTO case_results 
-            (run_id, case_id, question, generated_sql, expected_sql, execution_success,
-             sql_similarity_score, schema_compliance_score, result_accuracy_score,
-             overall_case_score, error_message, execution_time_ms)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+        case_rows = [
+            (
                 results["run_id"],
                 case_result["case_id"],
                 case_result["question"],
@@ -377,10 +479,24 @@ class NL2SQLEvaluator:
                 case_result["overall_case_score"],
                 case_result["error_message"],
                 case_result["execution_time_ms"]
-            ))
+            )
+            for case_result in results["case_results"]
+        ]
         
-        conn.commit()
-        conn.close()
+        # Single write transaction for the run summary and all case rows
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(_SQL_INSERT_RUN, (
+                results["run_id"],
+                results["timestamp"],
+                results["total_cases"],
+                results["passed_cases"],
+                results["failed_cases"],
+                results["overall_score"],
+                f"Automated evaluation run"
+            ))
+            
+            conn.executemany(_SQL_INSERT_CASE, case_rows)
 
     def _print_summary(self, results: Dict):
         """Print evaluation summary."""
@@ -397,7 +513,7 @@ class NL2SQLEvaluator:
         categories = {}
         for case_result in results["case_results"]:
             case_id = case_result["case_id"]
-            test_case = next((tc for tc in self.test_cases if tc["id"] == case_id), {})
+            test_case = self._test_cases_by_id.get(case_id, {})
             category = test_case.get("category", "unknown")
             
             if category not in categories:
@@ -419,8 +535,8 @@ class NL2SQLEvaluator:
 
     def get_historical_results(self, limit: int = 10) -> List[Dict]:
         """Get historical evaluation results."""
-        conn = sqlite3.connect(self.results_db)
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
+        cursor.row_factory = sqlite3.Row  # name-addressable rows built in C
         
         cursor.execute("""
         SELECT * FROM evaluation_runs 
@@ -428,11 +544,7 @@ class NL2SQLEvaluator:
         LIMIT ?
         """, (limit,))
         
-        columns = [desc[0] for desc in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        conn.close()
-        return results
+        return [dict(row) for row in cursor.fetchall()]
 
 
 def main():
@@ -1,5 +1,12 @@
 #!/usr/bin/env python3
-"""Bootstrap DuckDB database with sample data for local development."""
+"""
+Bootstrap DuckDB database with sample data for local development.
+
+The Python loader reads the CSVs into the `seeds` schema for direct queries,
+and `dbt seed` loads the typed seed relations that the dbt models `ref()`
+(dbt writes them to `main_seeds`, so the two loads do not overlap). Pass
+--skip-csv-load to leave seeding to dbt alone.
+"""
 
 import os
 import sys
@@ -15,12 +22,20 @@ from app.config import Config
 
 def main():
     """Bootstrap DuckDB database with sample data."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Bootstrap DuckDB database with sample data")
+    parser.add_argument("--skip-csv-load", action="store_true",
+                        help="Skip the Python CSV loader and let 'dbt seed' load the seeds")
+    args = parser.parse_args()
+    
     print("🚀 Bootstrapping DuckDB database...")
     
     # Ensure data directory exists
     db_path = Path(Config.DUCKDB_PATH)
     db_path.parent.mkdir(parents=True, exist_ok=True)
     
+    runner = None
     try:
         # Initialize DuckDB runner
         runner = DuckDBRunner(str(db_path))
@@ -55,16 +70,19 @@ def main():
             ("hr_attrition_events.csv", "seeds.hr_attrition_events")
         ]
         
-        print("📄 Loading seed data...")
-        for csv_file, table_name in seed_files:
-            csv_path = seeds_dir / csv_file
-            if csv_path.exists():
-                # Extract schema and table name
-                schema, table = table_name.split('.')
-                runner.load_csv_to_table(str(csv_path), table, schema)
-                print(f"   ✅ Loaded {csv_file} → {table_name}")
-            else:
-                print(f"   ⚠️  Warning: {csv_file} not found")
+        if args.skip_csv_load:
+            print("⏭️  Skipping CSV load, seeds will be loaded by 'dbt seed'")
+        else:
+            print("📄 Loading seed data...")
+            for csv_file, table_name in seed_files:
+                csv_path = seeds_dir / csv_file
+                if csv_path.exists():
+                    # Extract schema and table name
+                    schema, table = table_name.split('.')
+                    runner.load_csv_to_table(str(csv_path), table, schema)
+                    print(f"   ✅ Loaded {csv_file} → {table_name}")
+                else:
+                    print(f"   ⚠️  Warning: {csv_file} not found")
         
         # Run dbt transformations if dbt is available
         print("🔄 Attempting to run dbt transformations...")
@@ -79,10 +97,11 @@ def main():
             if result.returncode == 0:
                 print("📦 dbt found, running transformations...")
                 
-                # Run dbt commands
+                # Run dbt commands; 'dbt seed' always runs because the models
+                # ref() the typed seed relations, not the Python-loaded tables
                 dbt_commands = [
                     ['dbt', 'deps'],  # Install dependencies
-                    ['dbt', 'seed'],  # Load seeds (redundant but ensures consistency)
+                    ['dbt', 'seed'],  # Load seeds
                     ['dbt', 'run'],   # Run models
                     ['dbt', 'test']   # Run tests
                 ]
@@ -142,7 +161,8 @@ def main():
         sys.exit(1)
     
     finally:
-        runner.close()
+        if runner is not None:
+            runner.close()
 
 
 if __name__ == "__main__":
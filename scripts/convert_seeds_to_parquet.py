@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Convert the dbt seed CSVs to Parquet for warehouse bulk loads."""
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from analytics.seeds import SEED_DATE_COLUMNS, SEED_DTYPES, SEEDS_DIR, parquet_seed_path
+
+
+def convert_seed(csv_file: str) -> Path:
+    """Convert one seed CSV to a snappy Parquet file with the declared column types."""
+    df = pd.read_csv(
+        SEEDS_DIR / csv_file,
+        dtype=SEED_DTYPES.get(csv_file),
+        parse_dates=SEED_DATE_COLUMNS.get(csv_file, False),
+        keep_default_na=False,
+        na_values=[''],
+        engine='c'
+    )
+    
+    parquet_path = parquet_seed_path(csv_file)
+    parquet_path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(parquet_path, engine='pyarrow', compression='snappy', index=False,
+                  coerce_timestamps='us', allow_truncated_timestamps=True)
+    return parquet_path
+
+
+def main():
+    """Convert all seed CSVs to Parquet."""
+    print("🗜️  Converting seed CSVs to Parquet...")
+    
+    for csv_file in SEED_DTYPES:
+        if not (SEEDS_DIR / csv_file).exists():
+            print(f"   ⚠️  Warning: {csv_file} not found")
+            continue
+        
+        parquet_path = convert_seed(csv_file)
+        print(f"   ✅ {csv_file} → {parquet_path.relative_to(project_root)}")
+    
+    print("\n🎉 Parquet seeds ready. The CSVs in dbt/seeds remain the source of truth.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,44 @@
 #!/usr/bin/env python3
 """Load sample data to BigQuery."""
 
+import csv
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import List
+
 import pandas as pd
 
 # Add the project root to the Python path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+from google.cloud import bigquery
+
 from analytics.runners.bigquery_runner import BigQueryRunner
+from analytics.seeds import SEED_DATE_COLUMNS, SEED_DTYPES
 from app.config import Config
 
+# BigQuery column types for the pandas dtypes in SEED_DTYPES
+BQ_COLUMN_TYPES = {"str": "STRING", "int16": "INT64", "int32": "INT64", "bool": "BOOL"}
+
+
+def seed_schema(csv_path: Path, csv_file: str) -> List[bigquery.SchemaField]:
+    """Build an explicit load schema for a seed CSV, with its date columns typed as DATE."""
+    with open(csv_path, newline='') as f:
+        header = next(csv.reader(f))
+    
+    dtypes = SEED_DTYPES.get(csv_file, {})
+    date_columns = SEED_DATE_COLUMNS.get(csv_file, [])
+    return [
+        bigquery.SchemaField(
+            column, "DATE" if column in date_columns else BQ_COLUMN_TYPES.get(dtypes.get(column), "STRING")
+        )
+        for column in header
+    ]
+
 
 def main():
     """Load sample data to BigQuery."""
@@ -24,6 +50,7 @@ def main():
         print("   Please set BQ_PROJECT_ID and BQ_DATASET in your .env file")
         sys.exit(1)
     
+    runner = None
     try:
         # Initialize BigQuery runner
         runner = BigQueryRunner()
@@ -52,11 +79,30 @@ def main():
             ("hr_attrition_events.csv", "hr_attrition_events")
         ]
         
-        print("📄 Loading seed data...")
-        for csv_file, table_name in seed_files:
+        print_lock = threading.Lock()
+        
+        def load_seed(seed_file):
+            """Load one seed CSV, falling back to a pandas upload."""
+            csv_file, table_name = seed_file
             csv_path = seeds_dir / csv_file
-            if csv_path.exists():
+            if not csv_path.exists():
+                with print_lock:
+                    print(f"   ⚠️  Warning: {csv_file} not found")
+                return
+            
+            with print_lock:
                 print(f"   Loading {csv_file}...")
+            
+            try:
+                # Native load job: BigQuery parses the CSV server-side; the explicit
+                # schema keeps date columns as DATE instead of relying on autodetect
+                runner.load_csv_to_table(str(csv_path), table_name, Config.BQ_DATASET,
+                                         schema=seed_schema(csv_path, csv_file))
+                with print_lock:
+                    print(f"   ✅ Loaded {csv_file} to {Config.BQ_DATASET}.{table_name}")
+            except Exception as e:
+                with print_lock:
+                    print(f"   ⚠️  Native CSV load failed ({e}), falling back to pandas upload")
                 
                 # Read CSV
                 df = pd.read_csv(csv_path)
@@ -71,9 +117,14 @@ def main():
                 
                 # Load to BigQuery
                 runner.load_dataframe_to_table(df, table_name, Config.BQ_DATASET)
-                print(f"   ✅ Loaded {len(df)} rows to {Config.BQ_DATASET}.{table_name}")
-            else:
-                print(f"   ⚠️  Warning: {csv_file} not found")
+                with print_lock:
+                    print(f"   ✅ Loaded {len(df)} rows to {Config.BQ_DATASET}.{table_name}")
+        
+        # Load jobs are independent, so run them concurrently: wall time is
+        # the slowest file rather than the sum of all of them
+        print("📄 Loading seed data...")
+        with ThreadPoolExecutor(max_workers=len(seed_files)) as executor:
+            list(executor.map(load_seed, seed_files))
         
         # Setup dbt profile for BigQuery
         print("🔄 Setting up dbt profile for BigQuery...")
@@ -100,16 +151,18 @@ bi_assistant:
         
         profiles_file = dbt_profiles_dir / "profiles.yml"
         
-        if profiles_file.exists():
+        profile_exists = profiles_file.exists()
+        write_profile = True
+        if profile_exists:
             response = input(f"⚠️  {profiles_file} already exists. Overwrite? (y/N): ")
-            if response.lower() == 'y':
-                with open(profiles_file, 'w') as f:
-                    f.write(profiles_content)
-                print(f"✅ Updated dbt profile at {profiles_file}")
-        else:
-            with open(profiles_file, 'w') as f:
-                f.write(profiles_content)
-            print(f"✅ Created dbt profile at {profiles_file}")
+            write_profile = response.lower() == 'y'
+        
+        if write_profile:
+            # Write a temp file and swap it in so a crash can't leave a truncated profile
+            tmp_file = profiles_file.with_suffix('.yml.tmp')
+            tmp_file.write_text(profiles_content)
+            os.replace(tmp_file, profiles_file)
+            print(f"✅ {'Updated' if profile_exists else 'Created'} dbt profile at {profiles_file}")
         
         # Try to run dbt
         try:
@@ -175,7 +228,8 @@ bi_assistant:
         sys.exit(1)
     
     finally:
-        runner.close()
+        if runner is not None:
+            runner.close()
 
 
 if __name__ == "__main__":
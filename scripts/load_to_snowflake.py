@@ -3,14 +3,16 @@
 
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-import pandas as pd
 
 # Add the project root to the Python path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 from analytics.runners.snowflake_runner import SnowflakeRunner
+from analytics.seeds import SEED_DATE_COLUMNS, SEED_DTYPES, is_parquet_seed_current, parquet_seed_path
 from app.config import Config
 
 
@@ -27,26 +29,30 @@ def main():
         'SNOWFLAKE_DATABASE'
     ]
     
-    missing_vars = [var for var in required_vars if not getattr(Config, var)]
+    # Snapshot the settings once; they are reused for validation, output and the dbt profile
+    cfg = {var: getattr(Config, var, None) for var in required_vars + ['SNOWFLAKE_ROLE', 'SNOWFLAKE_SCHEMA']}
+    
+    missing_vars = [var for var in required_vars if not cfg[var]]
     if missing_vars:
         print(f"❌ Missing required environment variables: {', '.join(missing_vars)}")
         print("Please configure Snowflake connection settings in your .env file")
         sys.exit(1)
     
+    runner = None
     try:
         # Initialize Snowflake runner
-        runner = SnowflakeRunner()
+        # One runner means one connection and session for DDL, loads and verification
+        runner = SnowflakeRunner(query_tag='BI_ASSISTANT_SEED_LOAD')
         
-        print(f"📊 Connected to Snowflake account: {Config.SNOWFLAKE_ACCOUNT}")
-        print(f"🏢 Database: {Config.SNOWFLAKE_DATABASE}")
-        print(f"📁 Schema: {Config.SNOWFLAKE_SCHEMA}")
+        print(f"📊 Connected to Snowflake account: {cfg['SNOWFLAKE_ACCOUNT']}")
+        print(f"🏢 Database: {cfg['SNOWFLAKE_DATABASE']}")
+        print(f"📁 Schema: {cfg['SNOWFLAKE_SCHEMA']}")
         
         # Create schemas if they don't exist
         print("🔧 Creating schemas...")
         schemas = ['STAGING', 'MARTS', 'SEEDS']
-        for schema in schemas:
-            runner.create_schema(schema)
-            print(f"   ✅ Schema {schema} ready")
+        runner.create_schemas(schemas)
+        print(f"   ✅ Schemas ready: {', '.join(schemas)}")
         
         # Load seed data
         seeds_dir = project_root / "dbt" / "seeds"
@@ -56,20 +62,42 @@ def main():
             ("hr_attrition_events.csv", "HR_ATTRITION_EVENTS", "SEEDS")
         ]
         
-        print("📄 Loading seed data...")
-        for csv_file, table_name, schema in seed_files:
+        print_lock = threading.Lock()
+        
+        def load_seed(csv_file, table_name, schema):
+            """Load one seed CSV; each load uses its own cursor."""
             csv_path = seeds_dir / csv_file
-            if csv_path.exists():
-                print(f"   Loading {csv_file}...")
-                
-                # Read CSV
-                df = pd.read_csv(csv_path)
-                
-                # Load to Snowflake
-                runner.load_dataframe_to_table(df, table_name, schema)
-                print(f"   ✅ Loaded {len(df)} rows to {schema}.{table_name}")
+            if not csv_path.exists():
+                with print_lock:
+                    print(f"   ⚠️  Warning: {csv_file} not found")
+                return
+            
+            if is_parquet_seed_current(csv_file):
+                # Pre-converted Parquet seed: PUT the file as-is, no CSV parse or transcode
+                with print_lock:
+                    print(f"   Loading {parquet_seed_path(csv_file).name}...")
+                rows = runner.load_parquet_via_stage(str(parquet_seed_path(csv_file)), table_name, schema)
             else:
-                print(f"   ⚠️  Warning: {csv_file} not found")
+                with print_lock:
+                    print(f"   Loading {csv_file}...")
+                
+                # Stream the CSV in chunks through the table stage (Parquet PUT + COPY INTO)
+                rows = runner.load_csv_via_stage(
+                    str(csv_path), table_name, schema,
+                    dtype=SEED_DTYPES.get(csv_file),
+                    parse_dates=SEED_DATE_COLUMNS.get(csv_file, False),
+                    keep_default_na=False,
+                    na_values=['']
+                )
+            with print_lock:
+                print(f"   ✅ Loaded {rows} rows to {schema}.{table_name}")
+        
+        # PUT/COPY round-trips dominate and are independent per table
+        print("📄 Loading seed data...")
+        with ThreadPoolExecutor(max_workers=min(4, len(seed_files))) as executor:
+            futures = [executor.submit(load_seed, *seed_file) for seed_file in seed_files]
+            for future in as_completed(futures):
+                future.result()
         
         # Run dbt if available
         print("🔄 Setting up dbt profile for Snowflake...")
@@ -85,13 +113,13 @@ bi_assistant:
   outputs:
     snowflake:
       type: snowflake
-      account: {Config.SNOWFLAKE_ACCOUNT}
-      user: {Config.SNOWFLAKE_USER}
-      password: {Config.SNOWFLAKE_PASSWORD}
-      role: {Config.SNOWFLAKE_ROLE or 'PUBLIC'}
-      database: {Config.SNOWFLAKE_DATABASE}
-      warehouse: {Config.SNOWFLAKE_WAREHOUSE}
-      schema: {Config.SNOWFLAKE_SCHEMA or 'PUBLIC'}
+      account: {cfg['SNOWFLAKE_ACCOUNT']}
+      user: {cfg['SNOWFLAKE_USER']}
+      password: {cfg['SNOWFLAKE_PASSWORD']}
+      role: {cfg['SNOWFLAKE_ROLE'] or 'PUBLIC'}
+      database: {cfg['SNOWFLAKE_DATABASE']}
+      warehouse: {cfg['SNOWFLAKE_WAREHOUSE']}
+      schema: {cfg['SNOWFLAKE_SCHEMA'] or 'PUBLIC'}
       threads: 4
       keepalives_idle: 30
 """
@@ -99,46 +127,53 @@ bi_assistant:
         profiles_file = dbt_profiles_dir / "profiles.yml"
         
         # Ask user before overwriting existing profiles
+        write_profile = True
         if profiles_file.exists():
             response = input(f"⚠️  {profiles_file} already exists. Overwrite? (y/N): ")
-            if response.lower() != 'y':
+            write_profile = response.lower() == 'y'
+            if not write_profile:
                 print("Skipping dbt profile creation")
-            else:
-                with open(profiles_file, 'w') as f:
-                    f.write(profiles_content)
-                print(f"✅ Created dbt profile at {profiles_file}")
-        else:
-            with open(profiles_file, 'w') as f:
-                f.write(profiles_content)
+        
+        if write_profile:
+            # Write a temp file and swap it in so a crash can't leave a truncated profile
+            tmp_file = profiles_file.with_suffix('.yml.tmp')
+            tmp_file.write_text(profiles_content)
+            os.replace(tmp_file, profiles_file)
             print(f"✅ Created dbt profile at {profiles_file}")
         
         # Try to run dbt
         try:
             import subprocess
+            from importlib.util import find_spec
             
-            os.chdir(project_root)
+            dbt_env = {**os.environ, 'DBT_PROFILES_DIR': str(dbt_profiles_dir)}
             
-            # Check if dbt is available
-            result = subprocess.run(['dbt', '--version'], capture_output=True, text=True)
-            if result.returncode == 0:
+            # Check if dbt is importable; a module lookup replaces a `dbt --version` process
+            if find_spec('dbt') is not None:
                 print("📦 Running dbt transformations...")
                 
+                # `dbt build` runs seeds, models and tests in one invocation over a
+                # single adapter connection pool, in DAG order across 8 threads
+                dbt_dirs = ['--project-dir', str(project_root / 'dbt'), '--profiles-dir', str(dbt_profiles_dir)]
                 dbt_commands = [
-                    ['dbt', 'deps'],
-                    ['dbt', 'seed', '--target', 'snowflake'],
-                    ['dbt', 'run', '--target', 'snowflake'],
-                    ['dbt', 'test', '--target', 'snowflake']
+                    ['deps'] + dbt_dirs,
+                    ['build', '--target', 'snowflake', '--threads', '8'] + dbt_dirs
                 ]
                 
-                for cmd in dbt_commands:
-                    print(f"   Running: {' '.join(cmd)}")
-                    result = subprocess.run(cmd, cwd='dbt', capture_output=True, text=True)
-                    if result.returncode == 0:
-                        print(f"   ✅ {cmd[1]} completed")
+                for args in dbt_commands:
+                    print(f"   Running: dbt {' '.join(args)}")
+                    try:
+                        # In-process invocation skips a Python interpreter start per command
+                        from dbt.cli.main import dbtRunner
+                        success = dbtRunner().invoke(args).success
+                    except Exception:
+                        # Older dbt without the programmatic runner: fall back to the CLI
+                        success = subprocess.run(['dbt'] + args, env=dbt_env).returncode == 0
+                    
+                    if success:
+                        print(f"   ✅ {args[0]} completed")
                     else:
-                        print(f"   ⚠️  {cmd[1]} had issues:")
-                        if result.stderr:
-                            print(f"      {result.stderr}")
+                        print(f"   ⚠️  {args[0]} had issues")
             else:
                 print("⚠️  dbt not found. Install dbt-snowflake and run manually:")
                 print("   cd dbt && dbt run --target snowflake")
@@ -149,13 +184,26 @@ bi_assistant:
         # Verify data
         print("🔍 Verifying data load...")
         
-        for _, table_name, schema in seed_files:
-            try:
-                df, _ = runner.execute_query(f"SELECT COUNT(*) as count FROM {schema}.{table_name}")
-                count = df.iloc[0]['count']
-                print(f"   ✅ {schema}.{table_name}: {count} rows")
-            except Exception as e:
-                print(f"   ❌ {schema}.{table_name}: {e}")
+        # Row counts come from table metadata: one round-trip, no warehouse scan
+        schema_list = ", ".join(sorted({f"'{schema}'" for _, _, schema in seed_files}))
+        table_list = ", ".join(f"'{table_name}'" for _, table_name, _ in seed_files)
+        counts_sql = f"""
+        SELECT TABLE_SCHEMA, TABLE_NAME, ROW_COUNT
+        FROM {cfg['SNOWFLAKE_DATABASE']}.INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA IN ({schema_list}) AND TABLE_NAME IN ({table_list})
+        """
+        try:
+            df, _ = runner.execute_query(counts_sql)
+            row_counts = {(schema, table): count for schema, table, count in df.itertuples(index=False)}
+            
+            for _, table_name, schema in seed_files:
+                count = row_counts.get((schema, table_name))
+                if count is None:
+                    print(f"   ❌ {schema}.{table_name}: table not found")
+                else:
+                    print(f"   ✅ {schema}.{table_name}: {count} rows")
+        except Exception as e:
+            print(f"   ❌ Could not read row counts: {e}")
         
         # Show warehouse usage
         print("\n💰 Warehouse Usage:")
@@ -174,7 +222,8 @@ bi_assistant:
         sys.exit(1)
     
     finally:
-        runner.close()
+        if runner is not None:
+            runner.close()
 
 
 if __name__ == "__main__":
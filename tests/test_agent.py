@@ -1,6 +1,7 @@
 """Tests for the NL→SQL agent."""
 
 import pytest
+from contextlib import ExitStack
 from unittest.mock import Mock, patch
 
 from analytics.nl2sql.agent import NL2SQLAgent, create_agent
@@ -10,6 +11,16 @@ from analytics.runners.duckdb_runner import DuckDBRunner
 class TestNL2SQLAgent:
     """Test cases for NL2SQL agent functionality."""
 
+    @pytest.fixture(autouse=True, scope="class")
+    def _patch_llm(self):
+        """Patch Config and ChatOllama once for the whole class."""
+        with ExitStack() as stack:
+            mock_config = stack.enter_context(patch('analytics.nl2sql.agent.Config'))
+            mock_config.LLM_PROVIDER.value = "ollama"
+            mock_config.OLLAMA_MODEL = "llama3.1"
+            
+            yield stack.enter_context(patch('analytics.nl2sql.agent.ChatOllama'))
+
     @pytest.fixture
     def mock_runner(self):
         """Create mock warehouse runner."""
@@ -25,31 +36,22 @@ class TestNL2SQLAgent:
         return runner
 
     @pytest.fixture
-    def agent(self, mock_runner):
+    def agent(self, mock_runner, _patch_llm):
         """Create agent instance for testing."""
-        with patch('analytics.nl2sql.agent.Config') as mock_config:
-            mock_config.LLM_PROVIDER.value = "ollama"
-            mock_config.OLLAMA_MODEL = "llama3.1"
-            
-            with patch('analytics.nl2sql.agent.ChatOllama') as mock_llm:
-                mock_response = Mock()
-                mock_response.content = "SELECT department, COUNT(*) as headcount FROM marts.people.dim_employees WHERE is_active = true GROUP BY department LIMIT 1000"
-                mock_llm.return_value.return_value = [mock_response]
-                
-                agent = NL2SQLAgent(mock_runner)
-                return agent
+        mock_response = Mock()
+        mock_response.content = "SELECT department, COUNT(*) as headcount FROM marts.people.dim_employees WHERE is_active = true GROUP BY department LIMIT 1000"
+        # Fresh LLM mock per test; the class-level patch itself stays in place
+        _patch_llm.return_value = Mock(return_value=[mock_response])
+        
+        agent = NL2SQLAgent(mock_runner)
+        return agent
 
     def test_agent_initialization(self, mock_runner):
         """Test agent initializes correctly."""
-        with patch('analytics.nl2sql.agent.Config') as mock_config:
-            mock_config.LLM_PROVIDER.value = "ollama"
-            mock_config.OLLAMA_MODEL = "llama3.1"
-            
-            with patch('analytics.nl2sql.agent.ChatOllama'):
-                agent = NL2SQLAgent(mock_runner)
-                assert agent.warehouse_runner == mock_runner
-                assert agent.guardrails is not None
-                assert agent.schema_index is not None
+        agent = NL2SQLAgent(mock_runner)
+        assert agent.warehouse_runner == mock_runner
+        assert agent.guardrails is not None
+        assert agent.schema_index is not None
 
     def test_simple_headcount_query(self, agent):
         """Test simple headcount query translation."""
@@ -156,14 +158,9 @@ Which departments have the highest attrition rates?"""
 
     def test_create_agent_factory(self, mock_runner):
         """Test agent factory function."""
-        with patch('analytics.nl2sql.agent.Config') as mock_config:
-            mock_config.LLM_PROVIDER.value = "ollama"
-            mock_config.OLLAMA_MODEL = "llama3.1"
-            
-            with patch('analytics.nl2sql.agent.ChatOllama'):
-                agent = create_agent(mock_runner)
-                assert isinstance(agent, NL2SQLAgent)
-                assert agent.warehouse_runner == mock_runner
+        agent = create_agent(mock_runner)
+        assert isinstance(agent, NL2SQLAgent)
+        assert agent.warehouse_runner == mock_runner
 
     def test_attrition_query_complexity(self, agent):
         """Test complex attrition analysis query."""
@@ -1,32 +1,43 @@
 """Tests for chart generation and visualization components."""
 
 import pytest
+import numpy as np
 import pandas as pd
-import json
 from datetime import datetime, timedelta
 
-from analytics.viz.charts import ChartGenerator
+try:
+    from orjson import loads as json_loads
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    from json import loads as json_loads
+
+from analytics.viz.charts import ChartGenerator, _select_chart_type
+
+try:
+    MONTHS_2024 = pd.date_range('2024-01-01', periods=12, freq='ME')
+except ValueError:  # pandas < 2.2 only knows the month-end alias as 'M'
+    MONTHS_2024 = pd.date_range('2024-01-01', periods=12, freq='M')
 
 
 class TestChartGenerator:
     """Test cases for chart generation functionality."""
 
-    @pytest.fixture
+    # Sample frames are read-only inputs, so they are built once per module
+
+    @pytest.fixture(scope="module")
     def chart_gen(self):
         """Create chart generator instance."""
         return ChartGenerator()
 
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def sample_timeseries_data(self):
         """Create sample time series data."""
-        dates = pd.date_range('2024-01-01', periods=12, freq='M')
         return pd.DataFrame({
-            'month': dates,
+            'month': MONTHS_2024,
             'attrition_count': [15, 18, 12, 20, 25, 30, 22, 28, 35, 40, 32, 28],
             'headcount': [1000, 995, 990, 985, 975, 960, 950, 940, 925, 910, 900, 890]
         })
 
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def sample_categorical_data(self):
         """Create sample categorical data."""
         return pd.DataFrame({
@@ -35,7 +46,7 @@ class TestChartGenerator:
             'avg_salary': [95000, 75000, 68000, 62000, 70000]
         })
 
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def sample_kpi_data(self):
         """Create sample KPI data."""
         return pd.DataFrame({
@@ -44,6 +55,41 @@ class TestChartGenerator:
             'avg_tenure_years': [3.2]
         })
 
+    @pytest.fixture(scope="module")
+    def large_data(self):
+        """Create a 1000-row dataset."""
+        ids = np.arange(1000, dtype=np.int32)
+        categories = np.tile(np.array(['A', 'B', 'C']), 334)[:1000]  # Repeating pattern
+        return pd.DataFrame({'id': ids, 'value': ids, 'category': categories})
+
+    @pytest.fixture(scope="module")
+    def scatter_data(self):
+        """Create numeric relationship data."""
+        return pd.DataFrame({
+            'salary': [50000, 60000, 70000, 80000, 90000],
+            'tenure_years': [1, 2, 3, 5, 7],
+            'department': ['HR', 'IT', 'Sales', 'Engineering', 'Finance']
+        })
+
+    @pytest.fixture(scope="module")
+    def heatmap_data(self):
+        """Create categorical relationship data."""
+        return pd.DataFrame({
+            'department': ['Engineering', 'Engineering', 'Sales', 'Sales', 'Marketing', 'Marketing'],
+            'region': ['North', 'South', 'North', 'South', 'North', 'South'],
+            'avg_salary': [95000, 92000, 75000, 73000, 68000, 66000]
+        })
+
+    @pytest.fixture(scope="module")
+    def multi_metric_data(self):
+        """Create time series data with multiple numeric columns."""
+        return pd.DataFrame({
+            'month': MONTHS_2024[:6],
+            'hires': [25, 30, 22, 35, 28, 32],
+            'terminations': [18, 22, 15, 28, 20, 25],
+            'net_change': [7, 8, 7, 7, 8, 7]
+        })
+
     def test_auto_chart_type_selection_timeseries(self, chart_gen, sample_timeseries_data):
         """Test automatic chart type selection for time series data."""
         chart_type = chart_gen.auto_select_chart_type(sample_timeseries_data)
@@ -65,21 +111,31 @@ class TestChartGenerator:
         chart_type = chart_gen.auto_select_chart_type(empty_df)
         assert chart_type == 'table'
 
-    def test_line_chart_creation(self, chart_gen, sample_timeseries_data):
-        """Test line chart creation for time series data."""
+    @pytest.mark.parametrize("chart_type,data_name,expected_lib,expected_keys", [
+        pytest.param('line', 'sample_timeseries_data', 'altair', ('mark', 'encoding'), id='line'),
+        pytest.param('line', 'multi_metric_data', 'altair', ('encoding',), id='multi_metric_line'),
+        pytest.param('pie', 'sample_categorical_data', 'plotly', ('data',), id='pie'),
+        pytest.param('kpi', 'sample_kpi_data', 'plotly', ('data',), id='kpi'),
+        pytest.param('scatter', 'scatter_data', 'altair', ('mark',), id='scatter'),
+        pytest.param('heatmap', 'heatmap_data', 'altair', ('mark',), id='heatmap'),
+    ])
+    def test_chart_roundtrip(self, chart_gen, request, chart_type, data_name, expected_lib,
+                             expected_keys):
+        """Test each chart type produces a valid spec from the right library."""
+        data = request.getfixturevalue(data_name)
+        
         library, chart_data = chart_gen.create_chart(
-            sample_timeseries_data, 
-            chart_type='line',
-            title='Attrition Trends'
+            data,
+            chart_type=chart_type,
+            title=f'{chart_type.title()} Chart'
         )
         
-        assert library == 'altair'
+        assert library == expected_lib
         assert isinstance(chart_data, str)
         
-        # Parse and validate Altair JSON
-        chart_json = json.loads(chart_data)
-        assert 'mark' in chart_json
-        assert 'encoding' in chart_json
+        chart_json = json_loads(chart_data)
+        for key in expected_keys:
+            assert key in chart_json
 
     def test_bar_chart_creation(self, chart_gen, sample_categorical_data):
         """Test bar chart creation for categorical data."""
@@ -92,56 +148,11 @@ class TestChartGenerator:
         assert library == 'altair'
         assert isinstance(chart_data, str)
         
-        chart_json = json.loads(chart_data)
-        assert 'mark' in chart_json
-        assert chart_json['mark'] == 'bar'
-
-    def test_pie_chart_creation(self, chart_gen, sample_categorical_data):
-        """Test pie chart creation for categorical data."""
-        library, chart_data = chart_gen.create_chart(
-            sample_categorical_data,
-            chart_type='pie',
-            title='Department Distribution'
-        )
-        
-        assert library == 'plotly'
-        assert isinstance(chart_data, str)
-        
-        # Validate that it's valid JSON
-        chart_json = json.loads(chart_data)
-        assert 'data' in chart_json
-
-    def test_kpi_cards_creation(self, chart_gen, sample_kpi_data):
-        """Test KPI cards creation for single-row data."""
-        library, chart_data = chart_gen.create_chart(
-            sample_kpi_data,
-            chart_type='kpi',
-            title='Key Metrics'
-        )
-        
-        assert library == 'plotly'
-        assert isinstance(chart_data, str)
-        
-        chart_json = json.loads(chart_data)
-        assert 'data' in chart_json
-
-    def test_scatter_plot_creation(self, chart_gen):
-        """Test scatter plot creation for numeric relationships."""
-        scatter_data = pd.DataFrame({
-            'salary': [50000, 60000, 70000, 80000, 90000],
-            'tenure_years': [1, 2, 3, 5, 7],
-            'department': ['HR', 'IT', 'Sales', 'Engineering', 'Finance']
-        })
-        
-        library, chart_data = chart_gen.create_chart(
-            scatter_data,
-            chart_type='scatter',
-            title='Salary vs Tenure'
-        )
-        
-        assert library == 'altair'
-        chart_json = json.loads(chart_data)
+        chart_json = json_loads(chart_data)
         assert 'mark' in chart_json
+        # Altair 5 serializes the mark as a {'type': ...} object, older versions as a string
+        mark = chart_json['mark']
+        assert (mark['type'] if isinstance(mark, dict) else mark) == 'bar'
 
     def test_table_creation(self, chart_gen, sample_categorical_data):
         """Test table creation for data display."""
@@ -195,35 +206,12 @@ class TestChartGenerator:
         suggestion_types = [s['type'] for s in suggestions]
         assert 'kpi' in suggestion_types
 
-    def test_heatmap_creation(self, chart_gen):
-        """Test heatmap creation for categorical relationships."""
-        heatmap_data = pd.DataFrame({
-            'department': ['Engineering', 'Engineering', 'Sales', 'Sales', 'Marketing', 'Marketing'],
-            'region': ['North', 'South', 'North', 'South', 'North', 'South'],
-            'avg_salary': [95000, 92000, 75000, 73000, 68000, 66000]
-        })
-        
-        library, chart_data = chart_gen.create_chart(
-            heatmap_data,
-            chart_type='heatmap',
-            title='Salary Heatmap'
-        )
-        
-        assert library == 'altair'
-        chart_json = json.loads(chart_data)
-        assert 'mark' in chart_json
-
-    def test_large_dataset_chart_selection(self, chart_gen):
+    def test_large_dataset_chart_selection(self, chart_gen, large_data):
         """Test chart selection for large datasets."""
-        # Create large dataset
-        large_data = pd.DataFrame({
-            'id': range(1000),
-            'value': range(1000),
-            'category': ['A', 'B', 'C'] * 334  # Repeating pattern
-        })
-        
         chart_type = chart_gen.auto_select_chart_type(large_data)
-        assert chart_type == 'table'  # Should default to table for large datasets
+        # One categorical plus numeric columns is a bar chart at any size; the
+        # row-count fallback to table only applies after the column-type rules
+        assert chart_type == 'bar'
 
     def test_percentage_data_pie_chart(self, chart_gen):
         """Test that percentage data suggests pie charts."""
@@ -235,26 +223,6 @@ class TestChartGenerator:
         chart_type = chart_gen.auto_select_chart_type(percentage_data)
         assert chart_type == 'pie'
 
-    def test_multiple_numeric_columns_line_chart(self, chart_gen):
-        """Test line chart with multiple numeric columns."""
-        multi_metric_data = pd.DataFrame({
-            'month': pd.date_range('2024-01-01', periods=6, freq='M'),
-            'hires': [25, 30, 22, 35, 28, 32],
-            'terminations': [18, 22, 15, 28, 20, 25],
-            'net_change': [7, 8, 7, 7, 8, 7]
-        })
-        
-        library, chart_data = chart_gen.create_chart(
-            multi_metric_data,
-            chart_type='line',
-            title='HR Metrics Over Time'
-        )
-        
-        assert library == 'altair'
-        chart_json = json.loads(chart_data)
-        # Should handle multiple lines
-        assert 'encoding' in chart_json
-
     def test_chart_title_handling(self, chart_gen, sample_categorical_data):
         """Test that chart titles are properly applied."""
         custom_title = "Custom Chart Title"
@@ -266,7 +234,7 @@ class TestChartGenerator:
         )
         
         if library == 'altair':
-            chart_json = json.loads(chart_data)
+            chart_json = json_loads(chart_data)
             assert 'title' in chart_json
         elif library == 'table':
             assert custom_title in chart_data
@@ -285,6 +253,16 @@ class TestChartGenerator:
         # Should detect date column and suggest time series
         assert chart_type == 'line'
 
+    def test_chart_type_selection_is_memoized(self, chart_gen, sample_categorical_data):
+        """Test that frames with the same signature reuse the cached selection."""
+        _select_chart_type.cache_clear()
+        
+        first = chart_gen.auto_select_chart_type(sample_categorical_data)
+        second = chart_gen.auto_select_chart_type(sample_categorical_data.copy())
+        
+        assert first == second
+        assert _select_chart_type.cache_info().hits == 1
+
     def test_error_handling_invalid_chart_type(self, chart_gen, sample_categorical_data):
         """Test error handling for invalid chart types."""
         library, chart_data = chart_gen.create_chart(
@@ -293,4 +271,20 @@ class TestChartGenerator:
         )
         
         # Should fallback to table
-        assert library == 'table'
\ No newline at end of file
+        assert library == 'table'
+
+class TestChartComponents:
+    """Test cases for the Streamlit chart component helpers."""
+
+    def test_df_cache_key_handles_list_columns(self):
+        """Test that LIST-valued columns (e.g. array_agg results) can be keyed."""
+        charts = pytest.importorskip("app.components.charts")
+        df = pd.DataFrame({
+            'department': ['Engineering', 'Sales'],
+            'employee_ids': [[1, 2, 3], [4, 5]]
+        })
+        
+        key = charts.df_cache_key(df)
+        
+        assert key == charts.df_cache_key(df.copy())
+        assert key != charts.df_cache_key(df.assign(employee_ids=[[1, 2], [4, 5]]))
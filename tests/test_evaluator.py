@@ -0,0 +1,58 @@
+"""Tests for the NL→SQL evaluation harness helpers."""
+
+import pytest
+
+from eval.evaluator import NL2SQLEvaluator, _extract_table_references_cached
+
+
+class TestTableReferenceExtraction:
+    """Test cases for table reference extraction used in schema compliance scoring."""
+
+    @pytest.mark.parametrize("sql,expected", [
+        pytest.param(
+            "SELECT department FROM marts.people.dim_employees",
+            ("marts.people.dim_employees",), id="simple"
+        ),
+        pytest.param(
+            "SELECT e.full_name, r.region_name FROM marts.people.dim_employees e "
+            "JOIN seeds.hr_regions r ON e.region_id = r.region_id",
+            ("marts.people.dim_employees", "seeds.hr_regions"), id="join"
+        ),
+        pytest.param(
+            "SELECT EXTRACT(YEAR FROM hire_date) AS hire_year, COUNT(*) "
+            "FROM marts.people.dim_employees GROUP BY 1",
+            ("marts.people.dim_employees",), id="extract_from"
+        ),
+        pytest.param(
+            "SELECT TRIM(BOTH ' ' FROM department) FROM marts.people.dim_employees",
+            ("marts.people.dim_employees",), id="trim_from"
+        ),
+    ])
+    def test_extract_table_references(self, sql, expected):
+        """Test that only real table references are extracted."""
+        assert sorted(_extract_table_references_cached(sql)) == sorted(expected)
+
+
+class TestSingleCaseEvaluation:
+    """Test cases for per-case error handling."""
+
+    @pytest.fixture
+    def evaluator(self, tmp_path, monkeypatch):
+        """Create an evaluator whose results database lives in a temp directory."""
+        cases_file = tmp_path / "cases.yml"
+        cases_file.write_text("test_cases:\n  - id: case_1\n    question: How many employees?\n")
+        monkeypatch.chdir(tmp_path)
+        evaluator = NL2SQLEvaluator(str(cases_file))
+        yield evaluator
+        evaluator.close()
+
+    def test_agent_build_failure_fails_only_the_case(self, evaluator):
+        """Test that an agent that cannot be built is recorded as a failed case."""
+        def get_agent():
+            raise RuntimeError("no LLM credentials")
+        
+        result = evaluator._evaluate_single_case(evaluator.test_cases[0], get_agent, None)
+        
+        assert result["case_id"] == "case_1"
+        assert result["overall_case_score"] == 0.0
+        assert "no LLM credentials" in result["error_message"]
@@ -1,50 +1,74 @@
 """Tests for DuckDB runner functionality."""
 
 import pytest
-import tempfile
-import os
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 
 from analytics.runners.duckdb_runner import DuckDBRunner
 
 
+def _insert_rows(runner, table, data):
+    """Bulk insert a DataFrame or Arrow table, skipping the INSERT ... VALUES parser."""
+    runner.conn.register("_tmp", data)
+    try:
+        runner.conn.execute(f"INSERT INTO {table} SELECT * FROM _tmp")
+    finally:
+        runner.conn.unregister("_tmp")
+
+
 class TestDuckDBRunner:
     """Test cases for DuckDB database runner."""
 
-    @pytest.fixture
+    @pytest.fixture(scope="session")
     def temp_db_path(self):
-        """Create temporary database path for testing."""
-        with tempfile.NamedTemporaryFile(suffix='.duckdb', delete=False) as f:
-            db_path = f.name
-        yield db_path
-        # Cleanup
-        if os.path.exists(db_path):
-            os.unlink(db_path)
-
-    @pytest.fixture
+        """Use an in-memory database; no files to create or clean up."""
+        return ":memory:"
+
+    @pytest.fixture(scope="session")
     def runner(self, temp_db_path):
-        """Create DuckDB runner instance for testing."""
-        return DuckDBRunner(temp_db_path)
+        """Create one DuckDB runner shared by the whole session."""
+        runner = DuckDBRunner(temp_db_path)
+        yield runner
+        runner.close()
+
+    @pytest.fixture(autouse=True)
+    def _rollback(self, runner):
+        """Run each test in a transaction so tables and schemas don't leak between tests."""
+        runner.conn.execute("BEGIN TRANSACTION")
+        yield
+        runner.conn.execute("ROLLBACK")
+        runner.invalidate_schema_cache()
 
-    def test_connection_initialization(self, runner):
+    def test_connection_initialization(self):
         """Test that runner initializes and connects successfully."""
-        assert runner.conn is not None
-        assert runner.test_connection() is True
+        runner = DuckDBRunner(":memory:")
+        try:
+            assert runner.conn is not None
+            assert runner.test_connection() is True
+        finally:
+            runner.close()
 
     def test_basic_query_execution(self, runner):
         """Test basic SQL query execution."""
         sql = "SELECT 1 as test_value, 'hello' as test_string"
         
-        df, metadata = runner.execute_query(sql)
+        row = runner.execute_scalar(sql)
         
-        assert len(df) == 1
-        assert df.iloc[0]['test_value'] == 1
-        assert df.iloc[0]['test_string'] == 'hello'
-        assert metadata['row_count'] == 1
-        assert metadata['column_count'] == 2
-        assert metadata['warehouse'] == 'DuckDB'
+        assert row == (1, 'hello')
+
+    def test_scalar_path_invalidates_caches(self, runner):
+        """Test that writes through execute_scalar drop stale cached results."""
+        runner.execute_query("CREATE TABLE scalar_cache_test (id INTEGER)")
+        runner.execute_query("SELECT COUNT(*) AS n FROM scalar_cache_test")
+        
+        runner.execute_scalar("INSERT INTO scalar_cache_test VALUES (1)")
+        
+        df, metadata = runner.execute_query("SELECT COUNT(*) AS n FROM scalar_cache_test")
+        assert metadata['cache_hit'] is False
+        assert df.at[0, 'n'] == 1
 
     def test_create_schema(self, runner):
         """Test schema creation."""
@@ -68,23 +92,24 @@ class TestDuckDBRunner:
         runner.conn.execute(create_sql)
         
         # Insert test data
-        insert_sql = """
-        INSERT INTO test_employees VALUES 
-        (1, 'John Doe', 'Engineering', 80000),
-        (2, 'Jane Smith', 'Marketing', 70000),
-        (3, 'Bob Johnson', 'Sales', 60000)
-        """
-        runner.conn.execute(insert_sql)
+        _insert_rows(runner, "test_employees", pd.DataFrame({
+            'id': [1, 2, 3],
+            'name': ['John Doe', 'Jane Smith', 'Bob Johnson'],
+            'department': ['Engineering', 'Marketing', 'Sales'],
+            'salary': [80000, 70000, 60000]
+        }))
         
         # Query data
         df, metadata = runner.execute_query("SELECT * FROM test_employees ORDER BY id")
         
         assert len(df) == 3
-        assert df.iloc[0]['name'] == 'John Doe'
-        assert df.iloc[1]['department'] == 'Marketing'
+        assert df.at[0, 'name'] == 'John Doe'
+        assert df.at[1, 'department'] == 'Marketing'
         assert metadata['row_count'] == 3
+        assert metadata['column_count'] == 4
+        assert metadata['warehouse'] == 'DuckDB'
 
-    def test_csv_loading(self, runner):
+    def test_csv_loading(self, runner, tmp_path):
         """Test loading CSV data into table."""
         # Create test CSV data
         test_data = pd.DataFrame({
@@ -94,25 +119,30 @@ class TestDuckDBRunner:
             'salary': [50000, 70000, 60000]
         })
         
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            test_data.to_csv(f.name, index=False)
-            csv_path = f.name
+        csv_path = tmp_path / "data.csv"
+        csv_path.write_text(test_data.to_csv(index=False))
         
-        try:
-            # Load CSV to table
-            runner.load_csv_to_table(csv_path, 'employees', 'main')
-            
-            # Verify data was loaded
-            df, metadata = runner.execute_query("SELECT * FROM employees ORDER BY employee_id")
-            
-            assert len(df) == 3
-            assert df.iloc[0]['employee_id'] == 'EMP001'
-            assert df.iloc[1]['name'] == 'Bob'
-            assert metadata['row_count'] == 3
-            
-        finally:
-            # Cleanup
-            os.unlink(csv_path)
+        # Load CSV to table
+        runner.load_csv_to_table(str(csv_path), 'employees', 'main')
+        
+        # Verify data was loaded
+        df, metadata = runner.execute_query("SELECT * FROM employees ORDER BY employee_id")
+        
+        assert len(df) == 3
+        assert df.at[0, 'employee_id'] == 'EMP001'
+        assert df.at[1, 'name'] == 'Bob'
+        assert metadata['row_count'] == 3
+
+    def test_csv_loading_quoted_path(self, runner, tmp_path):
+        """Test loading a CSV whose path contains a quote character."""
+        csv_path = tmp_path / "o'brien.csv"
+        pd.DataFrame({'id': [1, 2], 'name': ['Alice', 'Bob']}).to_csv(csv_path, index=False)
+        
+        runner.load_csv_to_table(str(csv_path), 'quoted', 'seeds')
+        
+        df, _ = runner.execute_query("SELECT * FROM seeds.quoted ORDER BY id")
+        assert len(df) == 2
+        assert df.at[1, 'name'] == 'Bob'
 
     def test_schema_info_retrieval(self, runner):
         """Test schema information retrieval."""
@@ -139,11 +169,65 @@ class TestDuckDBRunner:
         assert 'created_date' in column_names
         assert 'is_active' in column_names
 
+    def test_query_results_cached_until_write(self, runner):
+        """Test that read-only results are cached and dropped after a write."""
+        runner.execute_query("CREATE TABLE cached_result_test (id INTEGER)")
+        runner.execute_query("INSERT INTO cached_result_test VALUES (1)")
+        
+        df, metadata = runner.execute_query("SELECT * FROM cached_result_test")
+        assert metadata['cache_hit'] is False
+        
+        # Callers mutating the returned metadata must not corrupt later hits
+        metadata['columns'].append('extra')
+        metadata['narrative'] = 'added by the caller'
+        
+        df, metadata = runner.execute_query("SELECT * FROM cached_result_test")
+        assert metadata['cache_hit'] is True
+        assert metadata['columns'] == ['id']
+        assert 'narrative' not in metadata
+        assert len(df) == 1
+        
+        runner.execute_query("INSERT INTO cached_result_test VALUES (2)")
+        df, metadata = runner.execute_query("SELECT * FROM cached_result_test")
+        assert metadata['cache_hit'] is False
+        assert len(df) == 2
+        
+        # Parameterized reads are cached per parameter set
+        runner.execute_query("SELECT * FROM cached_result_test WHERE id = ?", [2])
+        df, metadata = runner.execute_query("SELECT * FROM cached_result_test WHERE id = ?", [2])
+        assert metadata['cache_hit'] is True
+        assert df.at[0, 'id'] == 2
+        
+        df, metadata = runner.execute_query("SELECT * FROM cached_result_test WHERE id = ?", [1])
+        assert metadata['cache_hit'] is False
+        assert df.at[0, 'id'] == 1
+        
+        # Non-deterministic queries always run
+        _, metadata = runner.execute_query("SELECT random() AS r")
+        _, metadata = runner.execute_query("SELECT random() AS r")
+        assert metadata['cache_hit'] is False
+
+    def test_schema_info_cached_until_ddl(self, runner):
+        """Test that schema info is cached and refreshed after DDL through the runner."""
+        runner.execute_query("CREATE TABLE cached_schema_test (id INTEGER)")
+        
+        first = runner.get_schema_info()
+        assert runner.get_schema_info() == first
+        assert runner._schema_cache is not None
+        
+        # Returned column lists are copies, not views into the cache
+        first['main.cached_schema_test'].clear()
+        assert len(runner.get_schema_info()['main.cached_schema_test']) == 1
+        
+        runner.execute_query("CREATE TABLE cached_schema_test_2 (id INTEGER)")
+        assert runner._schema_cache is None
+        assert 'main.cached_schema_test_2' in runner.get_schema_info()
+
     def test_table_sample_retrieval(self, runner):
         """Test retrieving sample data from table."""
         # Create and populate test table
         runner.conn.execute("CREATE TABLE sample_test (id INTEGER, value VARCHAR)")
-        runner.conn.execute("INSERT INTO sample_test VALUES (1, 'a'), (2, 'b'), (3, 'c'), (4, 'd'), (5, 'e')")
+        _insert_rows(runner, "sample_test", pd.DataFrame({'id': range(1, 6), 'value': list('abcde')}))
         
         # Get sample
         sample_df = runner.get_table_sample('sample_test', limit=3)
@@ -152,7 +236,21 @@ class TestDuckDBRunner:
         assert 'id' in sample_df.columns
         assert 'value' in sample_df.columns
 
-    def test_script_execution(self, runner):
+    def test_cursor_temp_tables_are_isolated(self, runner):
+        """Test that temp tables on a runner cursor stay private and are dropped on close."""
+        with runner.cursor() as cursor:
+            cursor.execute("CREATE TEMP TABLE cursor_scratch AS SELECT * FROM range(3) t(id)")
+            assert cursor.execute("SELECT COUNT(*) FROM cursor_scratch").fetchone()[0] == 3
+            
+            with pytest.raises(Exception):
+                runner.conn.execute("SELECT * FROM cursor_scratch")
+        
+        remaining = runner.conn.execute(
+            "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = 'cursor_scratch'"
+        ).fetchone()[0]
+        assert remaining == 0
+
+    def test_script_execution(self, runner, tmp_path):
         """Test SQL script execution."""
         script_content = """
         CREATE TABLE script_test (id INTEGER, name VARCHAR);
@@ -160,20 +258,15 @@ class TestDuckDBRunner:
         INSERT INTO script_test VALUES (2, 'test2');
         """
         
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.sql', delete=False) as f:
-            f.write(script_content)
-            script_path = f.name
+        script_path = tmp_path / "script.sql"
+        script_path.write_text(script_content)
         
-        try:
-            runner.execute_script(script_path)
-            
-            # Verify script execution
-            df, _ = runner.execute_query("SELECT * FROM script_test ORDER BY id")
-            assert len(df) == 2
-            assert df.iloc[0]['name'] == 'test1'
-            
-        finally:
-            os.unlink(script_path)
+        runner.execute_script(str(script_path))
+        
+        # Verify script execution
+        df, _ = runner.execute_query("SELECT * FROM script_test ORDER BY id")
+        assert len(df) == 2
+        assert df.at[0, 'name'] == 'test1'
 
     def test_query_plan_retrieval(self, runner):
         """Test query execution plan retrieval."""
@@ -184,6 +277,10 @@ class TestDuckDBRunner:
         
         assert isinstance(plan, str)
         assert len(plan) > 0
+        
+        # Repeat calls are served from the plan cache
+        assert runner.get_query_plan("SELECT * FROM plan_test WHERE id > 100") == plan
+        assert runner._explain.cache_info().hits >= 1
 
     def test_database_stats(self, runner):
         """Test database statistics retrieval."""
@@ -194,9 +291,10 @@ class TestDuckDBRunner:
         assert stats['connection_status'] == 'connected'
         assert 'database_size_mb' in stats
 
-    def test_context_manager_usage(self, temp_db_path):
+    def test_context_manager_usage(self, tmp_path):
         """Test using runner as context manager."""
-        with DuckDBRunner(temp_db_path) as runner:
+        # Uses its own on-disk database since it exercises close()
+        with DuckDBRunner(str(tmp_path / "context.duckdb")) as runner:
             assert runner.test_connection() is True
             df, _ = runner.execute_query("SELECT 1 as test")
             assert len(df) == 1
@@ -225,8 +323,8 @@ class TestDuckDBRunner:
         runner.conn.execute("CREATE TABLE schema2.table2 (id INTEGER)")
         
         # Insert data
-        runner.conn.execute("INSERT INTO schema1.table1 VALUES (1), (2)")
-        runner.conn.execute("INSERT INTO schema2.table2 VALUES (3), (4)")
+        _insert_rows(runner, "schema1.table1", pd.DataFrame({'id': [1, 2]}))
+        _insert_rows(runner, "schema2.table2", pd.DataFrame({'id': [3, 4]}))
         
         # Query from specific schemas
         df1, _ = runner.execute_query("SELECT * FROM schema1.table1")
@@ -234,8 +332,13 @@ class TestDuckDBRunner:
         
         assert len(df1) == 2
         assert len(df2) == 2
-        assert df1.iloc[0]['id'] == 1
-        assert df2.iloc[0]['id'] == 3
+        
+        # Same statement shape, different bound values
+        for table, expected_id in [('schema1.table1', 2), ('schema2.table2', 4)]:
+            df, _ = runner.execute_query(f"SELECT * FROM {table} WHERE id = ?", [expected_id])
+            assert df.at[0, 'id'] == expected_id
+        assert df1.at[0, 'id'] == 1
+        assert df2.at[0, 'id'] == 3
 
     def test_large_dataset_handling(self, runner):
         """Test handling of larger datasets."""
@@ -243,16 +346,33 @@ class TestDuckDBRunner:
         runner.conn.execute("CREATE TABLE large_test (id INTEGER, value DOUBLE)")
         
         # Insert 1000 rows
-        insert_sql = "INSERT INTO large_test SELECT i, random() FROM range(1000) as t(i)"
-        runner.conn.execute(insert_sql)
+        _insert_rows(runner, "large_test", pa.Table.from_pydict({
+            'id': np.arange(1000, dtype=np.int32),
+            'value': np.random.rand(1000)
+        }))
         
-        # Query data
-        df, metadata = runner.execute_query("SELECT * FROM large_test")
+        # Query data as Arrow; only counts and column names are needed
+        table = runner.execute_query_arrow("SELECT * FROM large_test")
+        
+        assert table.num_rows == 1000
+        assert 'id' in table.column_names
+        assert 'value' in table.column_names
         
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
         assert len(df) == 1000
-        assert metadata['row_count'] == 1000
-        assert 'id' in df.columns
-        assert 'value' in df.columns
+
+    def test_arrow_path_invalidates_caches(self, runner):
+        """Test that DDL and writes through execute_query_arrow drop stale cached results."""
+        runner.get_schema_info()  # Warm the schema cache
+        runner.execute_query_arrow("CREATE TABLE arrow_cache_test (id INTEGER)")
+        assert 'main.arrow_cache_test' in runner.get_schema_info()
+        
+        runner.execute_query("SELECT COUNT(*) AS n FROM arrow_cache_test")
+        runner.execute_query_arrow("INSERT INTO arrow_cache_test VALUES (1)")
+        
+        df, metadata = runner.execute_query("SELECT COUNT(*) AS n FROM arrow_cache_test")
+        assert metadata['cache_hit'] is False
+        assert df.at[0, 'n'] == 1
 
     def test_data_types_handling(self, runner):
         """Test handling of various data types."""
@@ -268,22 +388,19 @@ class TestDuckDBRunner:
         """
         runner.conn.execute(create_sql)
         
-        insert_sql = """
-        INSERT INTO types_test VALUES (
-            42,
-            3.14159,
-            'test string',
-            '2024-01-15',
-            true,
-            '2024-01-15 10:30:00'
-        )
-        """
-        runner.conn.execute(insert_sql)
+        _insert_rows(runner, "types_test", pd.DataFrame({
+            'int_col': [42],
+            'float_col': [3.14159],
+            'string_col': ['test string'],
+            'date_col': pd.to_datetime(['2024-01-15']).date,
+            'bool_col': [True],
+            'timestamp_col': pd.to_datetime(['2024-01-15 10:30:00'])
+        }))
         
         df, _ = runner.execute_query("SELECT * FROM types_test")
         
         assert len(df) == 1
-        assert df.iloc[0]['int_col'] == 42
-        assert abs(df.iloc[0]['float_col'] - 3.14159) < 0.0001
-        assert df.iloc[0]['string_col'] == 'test string'
-        assert df.iloc[0]['bool_col'] is True
\ No newline at end of file
+        assert df.at[0, 'int_col'] == 42
+        assert abs(df.at[0, 'float_col'] - 3.14159) < 0.0001
+        assert df.at[0, 'string_col'] == 'test string'
+        assert bool(df.at[0, 'bool_col']) is True
\ No newline at end of file